@@ -30,7 +30,7 @@ literal LIT;
 
 from bovinus.token import *
 from bovinus.grammar import Grammar, Rule, defineRule, \
-expand, transform, tokenNode as tn, connector, fork, zeroToMany, \
+initialize, expand, transform, tokenNode as tn, connector, fork, zeroToMany, \
 zeroToOne, oneToMany, sequence
 from bovinus.parser import AstNode
 from bovinus.parsergen.ast import PropertiesNode, KeywordNode, WordNode, PrefixNode, \
@@ -148,6 +148,11 @@ def _enable_transform(astNode):
     
 _PropsRule = defineRule("properties")
 
+@initialize(_PropsRule)
+def _props_init(rule):
+
+    rule.setContextDependent([ENVVAR_TOKEN_TYPE])
+
 @expand(_PropsRule)
 def _props_expand(start, end, context):
     
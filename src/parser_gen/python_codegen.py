@@ -164,6 +164,7 @@ class PythonCodeGenerator(AbstractCodeGenerator):
             self._add(res, "grammar.Grammar.__init__(self, %s)" % self.VAR_ALL_TOKEN_TYPES)
         self._add(res)
         self._add(res, "self.setContextIndependent()")
+        self._add(res, "self.setTemplateKey(self.__class__)")
         self._add(res)
         self._dedent()
                 
@@ -0,0 +1,244 @@
+#! coding=UTF-8
+
+# Copyright 2012 Thomas Bollmeier <tbollmeier@web.de>
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Parse many files in parallel worker processes
+"""
+
+from .parser import Parser, TreeCatg, ParseError, ParseLimitError
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from argparse import ArgumentParser
+from importlib import import_module
+import os
+import sys
+
+class ParseFailure(object):
+
+    def __init__(self, exception):
+
+        self.errorType = exception.__class__.__name__
+        self.message = str(exception)
+        self.line = None
+        self.column = None
+
+        if isinstance(exception, ParseError):
+            self.line = exception.line
+            self.column = exception.column
+        elif isinstance(exception, ParseLimitError) and exception.token:
+            self.line, self.column = exception.token.getStartPosition()
+
+    def __str__(self):
+
+        return "%s: %s" % (self.errorType, self.message)
+
+class ParseResult(object):
+
+    def __init__(self, index, filePath, result=None, error=None):
+
+        self.index = index
+        self.filePath = filePath
+        self.result = result
+        self.error = error
+
+    def isOk(self):
+
+        return self.error is None
+
+def parseMany(filePaths,
+              parserFactory,
+              workers=None,
+              chunksize=1,
+              ordered=True,
+              treeCatg=TreeCatg.AST,
+              resultFunc=None,
+              maxPending=None
+              ):
+    """
+    Parses the files in worker processes and yields a ParseResult per
+    file. parserFactory (returning a Parser or a Grammar) and resultFunc
+    must be picklable. With 0 workers the files are parsed in the
+    calling process. At most maxPending chunks are pending at a time.
+    """
+    chunks = _iterChunks(filePaths, chunksize)
+
+    if workers == 0:
+        _initWorker(parserFactory)
+        for chunk in chunks:
+            for res in _parseChunk(chunk, treeCatg, resultFunc):
+                yield res
+        return
+
+    workers = workers or os.cpu_count()
+    maxPending = maxPending or 2 * workers
+
+    with ProcessPoolExecutor(workers,
+                             initializer=_initWorker,
+                             initargs=(parserFactory,)
+                             ) as executor:
+
+        futures = deque()
+
+        for chunk in chunks:
+            if len(futures) >= maxPending:
+                for res in _popResults(futures, ordered):
+                    yield res
+            futures.append(executor.submit(_parseChunk, chunk, treeCatg, resultFunc))
+
+        while futures:
+            for res in _popResults(futures, ordered):
+                yield res
+
+def _iterChunks(filePaths, chunksize):
+
+    chunk = []
+
+    for idx, filePath in enumerate(filePaths):
+        chunk.append((idx, filePath))
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+def _popResults(futures, ordered):
+
+    if ordered:
+        future = futures.popleft()
+    else:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        future = done.pop()
+        futures.remove(future)
+
+    return future.result()
+
+_workerParser = None
+
+def _initWorker(parserFactory):
+
+    global _workerParser
+
+    parser = parserFactory()
+    if not isinstance(parser, Parser):
+        parser = Parser(parser)
+
+    _workerParser = parser
+
+def _parseChunk(chunk, treeCatg, resultFunc):
+
+    res = []
+
+    for idx, filePath in chunk:
+        try:
+            ast = _workerParser.parseFile(filePath, treeCatg)
+            if resultFunc:
+                ast = resultFunc(ast)
+            res.append(ParseResult(idx, filePath, ast))
+        except Exception as error:
+            res.append(ParseResult(idx, filePath, error=ParseFailure(error)))
+
+    return res
+
+def toXml(ast):
+
+    return ast.toXml()
+
+def loadFactory(name):
+
+    moduleName, _, objectName = name.partition(":")
+    if not objectName:
+        raise Exception("Parser factory must be given as 'module:name'")
+
+    return getattr(import_module(moduleName), objectName)
+
+def createArgumentParser():
+
+    res = ArgumentParser(
+      description = "Parse files in parallel and write their ASTs as XML."
+      )
+
+    res.add_argument("files",
+      nargs = "+",
+      metavar = "FILE",
+      help = "file to parse"
+      )
+
+    res.add_argument("-p", "--parser",
+      dest = "parser",
+      required = True,
+      metavar = "MODULE:FACTORY",
+      help = "callable that creates the parser or grammar, e.g. my_parser:MyParser"
+      )
+
+    res.add_argument("-o", "--output-dir",
+      dest = "output_dir",
+      default = ".",
+      metavar = "DIR",
+      help = "write FILE.xml to DIR, keeping the paths relative to the "
+             "common directory of all files (default: current directory)"
+      )
+
+    res.add_argument("-j", "--workers",
+      dest = "workers",
+      type = int,
+      default = None,
+      metavar = "N",
+      help = "number of worker processes (default: number of CPUs)"
+      )
+
+    res.add_argument("--chunksize",
+      dest = "chunksize",
+      type = int,
+      default = 1,
+      metavar = "N",
+      help = "number of files handed to a worker at once (default: 1)"
+      )
+
+    return res
+
+def main(argv=None):
+
+    args = createArgumentParser().parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    parserFactory = loadFactory(args.parser)
+
+    # Mirror the input paths so that equal file names do not collide:
+    filePaths = [os.path.abspath(filePath) for filePath in args.files]
+    baseDir = os.path.commonpath([os.path.dirname(filePath) for filePath in filePaths])
+
+    numErrors = 0
+
+    for res in parseMany(filePaths,
+                         parserFactory,
+                         workers=args.workers,
+                         chunksize=args.chunksize,
+                         ordered=False,
+                         resultFunc=toXml
+                         ):
+        if res.isOk():
+            outPath = os.path.join(args.output_dir,
+                                   os.path.relpath(res.filePath, baseDir) + ".xml")
+            os.makedirs(os.path.dirname(outPath), exist_ok=True)
+            f = open(outPath, "w")
+            f.write(res.result)
+            f.close()
+        else:
+            numErrors += 1
+            sys.stderr.write("%s: %s\n" % (args.files[res.index], res.error))
+
+    return numErrors and 1 or 0
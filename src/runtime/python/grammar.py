@@ -14,6 +14,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import pickle
+import threading
+import weakref
+from collections import OrderedDict
+from .token import Keyword
+
 # ===== Interne Objekte: =====
 
 class Connectable(object):
@@ -58,6 +65,56 @@ class GrammarElement(object):
 
 # ===== API =====
 
+class ExpansionStatistics(object):
+
+    def __init__(self):
+
+        self.reset()
+
+    def reset(self):
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+class ExpansionCache(object):
+
+    DEFAULT_SIZE = 32
+
+    def __init__(self, maxEntries=DEFAULT_SIZE):
+
+        self._maxEntries = maxEntries
+        self._entries = OrderedDict()
+        self._statistics = ExpansionStatistics()
+
+    def get(self, key):
+
+        start = self._entries.get(key)
+
+        if start is not None:
+            self._entries.move_to_end(key)
+            self._statistics.hits += 1
+        else:
+            self._statistics.misses += 1
+
+        return start
+
+    def add(self, key, start):
+
+        self._entries[key] = start
+
+        if len(self._entries) > self._maxEntries:
+            self._entries.popitem(last=False)
+            self._statistics.evictions += 1
+
+    def getSize(self):
+
+        return len(self._entries)
+
+    def getStatistics(self):
+
+        return self._statistics
+
 class Rule(Connectable, Pluggable, GrammarElement):
 
     def __init__(self, name='', identifier=''):
@@ -76,7 +133,10 @@ class Rule(Connectable, Pluggable, GrammarElement):
         self._end = RuleEndNode(self)
         self._envVars = {}
         
-        self._contextDependent = True
+        self._contextDependent = None # Not known yet
+        self._contextKeys = None # Context features read by expand()
+        self._maxExpansions = 0
+        self._templateKey = None
 
     def expand(self, start, end, context):
 
@@ -88,12 +148,79 @@ class Rule(Connectable, Pluggable, GrammarElement):
         return astNode
 
     def dependsOnContext(self):
-        
+        """
+        Undeclared rules are expanded once with a stand-in context. If
+        expand() neither uses nor keeps it, the rule is context independent.
+        Rules depending on anything else (e.g. "context is None") must
+        declare it.
+        """
+        if self._contextDependent is None:
+            self._contextDependent = self._start._probeContext()
+
         return self._contextDependent 
     
     def setContextIndependent(self):
         
-        self._contextDependent = False
+        self._setContextDependence(False)
+
+    def setContextDependent(self,
+                            envVars=None,
+                            keyword=False,
+                            maxEntries=ExpansionCache.DEFAULT_SIZE
+                            ):
+        """
+        With the names of the environment variables expand() reads (and
+        keyword if it reads the current keyword) up to maxEntries
+        expansions are cached.
+        """
+        self._setContextDependence(True)
+
+        if envVars is not None:
+            self._contextKeys = tuple(envVars), keyword
+            self._maxExpansions = maxEntries
+        else:
+            self._contextKeys = None
+            self._maxExpansions = 0
+
+    def getExpansionKey(self, context):
+
+        if self._contextKeys is None or context is None:
+            return None
+
+        envVars, keyword = self._contextKeys
+        res = tuple(context.getEnvVar(name) for name in envVars)
+        if keyword:
+            keyword = context.getCurKeyword()
+            res += (keyword and keyword.getId(),)
+
+        try:
+            hash(res)
+        except TypeError:
+            return None
+
+        return res
+
+    def getMaxExpansions(self):
+
+        return self._maxExpansions
+
+    def _setContextDependence(self, dependent):
+
+        self._contextDependent = dependent
+        if self._start._firstSetGraph:
+            # FIRST sets computed so far are outdated:
+            self._start._firstSetGraph.invalidate()
+
+    def setTemplateKey(self, key):
+        """
+        Rules with equal keys, names and environments share one expansion
+        in Grammar.compile().
+        """
+        self._templateKey = key
+
+    def getTemplateKey(self):
+
+        return self._templateKey
 
     def getName(self):
 
@@ -143,6 +270,8 @@ class initialize(object):
 
         self._ruleFactory._initFunc = initFunc
 
+        return initFunc
+
 class expand(object):
 
     def __init__(self, ruleFactory):
@@ -153,6 +282,8 @@ class expand(object):
 
         self._ruleFactory._expandFunc = expandFunc
 
+        return expandFunc
+
 class transform(object):
 
     def __init__(self, ruleFactory):
@@ -163,6 +294,8 @@ class transform(object):
 
         self._ruleFactory._transformFunc = transformFunc
 
+        return transformFunc
+
 class Grammar(Rule):
 
     def __init__(self, tokenTypes):
@@ -175,6 +308,133 @@ class Grammar(Rule):
 
         return self._tokenTypes
 
+    def sharesRuleNodes(self):
+
+        return False
+
+    def compile(self):
+
+        return CompiledGrammar(self)
+
+class CompiledGrammar(object):
+    """
+    Grammar precompiled into a picklable table of nodes. Context
+    independent rules are expanded once and shared by their occurrences.
+    """
+
+    def __init__(self, grammar):
+
+        compiler = _GrammarCompiler(grammar.getTokenTypes())
+
+        self._grammarClass = grammar.__class__
+        self._tokenTypes = list(grammar.getTokenTypes())
+        self._socket = compiler.compile(grammar)
+        self._table = compiler.getTable()
+
+        self._createNodes()
+
+    @staticmethod
+    def load(filePath):
+
+        f = open(filePath, "rb")
+        res = pickle.load(f)
+        f.close()
+
+        if not isinstance(res, CompiledGrammar):
+            raise Exception("'%s' does not contain a compiled grammar" % filePath)
+
+        return res
+
+    def save(self, filePath):
+
+        f = open(filePath, "wb")
+        pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+
+    def getTokenTypes(self):
+
+        return self._tokenTypes
+
+    def getSocket(self):
+
+        return self._nodes[self._socket]
+
+    def getNumNodes(self):
+
+        return len(self._table)
+
+    def sharesRuleNodes(self):
+
+        return True
+
+    def __getstate__(self):
+
+        # The grammar class comes first, so that its module has created
+        # its token types before the pickled ones are restored:
+        return {
+          "grammarClass" : self._grammarClass,
+          "tokenTypes" : self._tokenTypes,
+          "socket" : self._socket,
+          "table" : self._table
+          }
+
+    def __setstate__(self, state):
+
+        self._grammarClass = state["grammarClass"]
+        self._tokenTypes = state["tokenTypes"]
+        self._socket = state["socket"]
+        self._table = state["table"]
+
+        self._createNodes()
+
+    def _createNodes(self):
+
+        nodes = []
+
+        for kind, successors, data in self._table:
+            if kind == _GrammarCompiler.TECHNICAL:
+                node = PlugNode(Node.TECHNICAL)
+            elif kind == _GrammarCompiler.COMMIT:
+                node = CommitNode()
+            elif kind == _GrammarCompiler.TOKEN:
+                tokenType, identifier, changeFunc, undoFunc = data
+                node = TokenNode(tokenType, identifier)
+                node.setEnvChange(changeFunc, undoFunc)
+            elif kind == _GrammarCompiler.RULE_START:
+                name, identifier, envVars = data[:3]
+                node = _SharedRuleStartNode(name, identifier, envVars)
+            elif kind == _GrammarCompiler.RULE_END:
+                node = _SharedRuleEndNode(data)
+            elif kind == _GrammarCompiler.CONTEXT_RULE:
+                node = _copyRule(data[0]).getSocket()
+            elif kind == _GrammarCompiler.SWITCH:
+                node = _SwitchNode()
+            elif kind == _GrammarCompiler.KEYWORD_FORK:
+                node = _KeywordForkNode()
+            elif kind == _GrammarCompiler.CONDITION:
+                node = _ConditionalNode(data, None)
+            nodes.append(node)
+
+        for node, (kind, successors, data) in zip(nodes, self._table):
+            if kind == _GrammarCompiler.RULE_START:
+                node._successors = [nodes[idx] for idx in successors]
+                node._returns = [nodes[idx] for idx in data[4]]
+                nodes[data[3]]._callers.append(node)
+            elif kind == _GrammarCompiler.CONTEXT_RULE:
+                end = node._ruleAccess.getEndNode()
+                for idx in data[1]:
+                    end.connectTo(nodes[idx])
+            elif kind in (_GrammarCompiler.SWITCH, _GrammarCompiler.KEYWORD_FORK):
+                node._successors = [nodes[idx] for idx in successors]
+                for keyword, idx in data:
+                    node.addBranch(keyword, nodes[idx])
+            elif kind == _GrammarCompiler.CONDITION:
+                node._end = nodes[successors[0]]
+            elif kind != _GrammarCompiler.RULE_END:
+                node._successors = [nodes[idx] for idx in successors]
+
+        self._nodes = nodes
+
 def tokenNode(tokenType, identifier=''):
 
     if not tokenType:
@@ -186,6 +446,13 @@ def connector():
 
     return PlugNode(Node.TECHNICAL)
 
+def commit():
+    """
+    The parser does not backtrack in front of a commit point, even
+    with full backtracking.
+    """
+    return CommitNode()
+
 def connect(predecessor, successor):
 
     predecessor.getPlug().connectTo(successor.getSocket())
@@ -221,7 +488,12 @@ class Switch(Connectable, Pluggable, GrammarElement):
         GrammarElement.__init__(self)
 
         self._end = connector()
-        self._start = _SwitchNode(branches, self._end)
+        self._start = _SwitchNode()
+
+        for keyword, branch in branches.items():
+            entry = connector()
+            entry.connect(branch).connect(self._end)
+            self._start.addBranch(keyword, entry)
 
     def getSocket(self):
 
@@ -268,6 +540,40 @@ class SuccessorError(Exception):
 
 # ===== Interne Objekte: =====
 
+class _ContextConsulted(Exception):
+
+    pass
+
+class _ContextProbe(object):
+
+    def __init__(self):
+
+        self.consulted = False
+
+    def _consult(self):
+
+        self.consulted = True
+
+        raise _ContextConsulted
+
+    def __getattr__(self, name):
+
+        self._consult()
+
+    def __getitem__(self, name):
+
+        self._consult()
+
+    def __bool__(self):
+
+        self._consult()
+
+    def __eq__(self, other):
+
+        self._consult()
+
+    __hash__ = object.__hash__
+
 class _CustomRule(Rule):
 
     def __init__(self,
@@ -280,6 +586,9 @@ class _CustomRule(Rule):
 
         Rule.__init__(self, name, ident)
 
+        # Rules of one factory differ in their identifier only:
+        self.setTemplateKey((initFunc, expandFunc, transformFunc))
+
         if initFunc:
             initFunc(self)
 
@@ -350,6 +659,10 @@ class Node(Connectable, Socket):
         self.__techId = Node.__nextTechId
         Node.__nextTechId += 1
 
+        self._firstSet = None
+        self._firstSetGraph = None
+        self._firstSetVersion = -1
+
     def getTokenType(self):
 
         return self._tokenType
@@ -374,6 +687,10 @@ class Node(Connectable, Socket):
 
         return self.catg == Node.TECHNICAL
 
+    def isCommitPoint(self):
+
+        return False
+
     def getSocket(self):
 
         return self
@@ -382,6 +699,136 @@ class Node(Connectable, Socket):
 
         return self.__techId
 
+    def getFirstSet(self):
+
+        if not self._hasFirstSet():
+            _computeFirstSets(self)
+
+        return self._firstSet
+
+    def _hasFirstSet(self):
+
+        graph = self._firstSetGraph
+
+        return graph is not None and self._firstSetVersion == graph.version
+
+    def _getFirstSetSuccessors(self, firstSet):
+
+        return None
+
+class _FirstSetGraph(object):
+
+    _lock = threading.Lock()
+
+    def __init__(self):
+
+        self.version = 0
+        # Graphs of discarded expansions must not be kept alive:
+        self._dependents = weakref.WeakSet()
+
+    def addDependent(self, graph):
+
+        if graph is not self:
+            with self._lock:
+                self._dependents.add(graph)
+
+    def invalidate(self):
+
+        with self._lock:
+            graphs = [self]
+            seen = set(graphs)
+            while graphs:
+                graph = graphs.pop()
+                graph.version += 1
+                for dependent in list(graph._dependents):
+                    if dependent not in seen:
+                        seen.add(dependent)
+                        graphs.append(dependent)
+                graph._dependents = weakref.WeakSet()
+
+def _computeFirstSets(root):
+    """
+    Nodes on a cycle share one FIRST set, so the strongly connected
+    components are determined with an iterative Tarjan algorithm.
+    """
+    graph = root._firstSetGraph or _FirstSetGraph()
+    version = graph.version
+    indexes = {}
+    lowLinks = {}
+    firstSets = {}
+    components = []
+    callStack = []
+
+    def visit(node):
+
+        indexes[node] = lowLinks[node] = len(indexes)
+        components.append(node)
+        node._firstSetGraph = graph
+        node._firstSetVersion = -1
+        firstSet = set()
+        successors = node._getFirstSetSuccessors(firstSet)
+        if successors is None:
+            firstSets[node] = None
+            successors = []
+        else:
+            firstSets[node] = firstSet
+        callStack.append((node, iter(successors)))
+
+    def merge(node, firstSet):
+
+        if firstSet is None:
+            firstSets[node] = None
+        elif firstSets[node] is not None:
+            firstSets[node] |= firstSet
+
+    visit(root)
+
+    while callStack:
+
+        node, successors = callStack[-1]
+
+        for succ in successors:
+            if succ._firstSetGraph is graph:
+                known = succ._firstSetVersion == version
+            elif succ._hasFirstSet():
+                succ._firstSetGraph.addDependent(graph)
+                known = True
+            else:
+                known = False
+            if known:
+                merge(node, succ._firstSet)
+            elif succ not in indexes:
+                visit(succ)
+                break
+            else:
+                # Successor is part of an unfinished component:
+                lowLinks[node] = min(lowLinks[node], indexes[succ])
+        else:
+            callStack.pop()
+
+            if lowLinks[node] == indexes[node]:
+                members = []
+                while not members or members[-1] is not node:
+                    members.append(components.pop())
+                firstSet = set()
+                for member in members:
+                    if firstSets[member] is None:
+                        firstSet = None
+                        break
+                    firstSet |= firstSets[member]
+                if firstSet is not None:
+                    firstSet = frozenset(firstSet)
+                for member in members:
+                    member._firstSet = firstSet
+                    member._firstSetVersion = version
+
+            if callStack:
+                parent = callStack[-1][0]
+                if node._firstSetVersion == version:
+                    merge(parent, node._firstSet)
+                else:
+                    lowLinks[parent] = min(lowLinks[parent], lowLinks[node])
+
 class PlugNode(Node, Pluggable, Plug, GrammarElement):
 
     def __init__(self, category, tokenType = None):
@@ -405,6 +852,12 @@ class PlugNode(Node, Pluggable, Plug, GrammarElement):
 
         if not socket in self._successors:
             self._successors.append(socket)
+            if self._firstSetGraph:
+                self._firstSetGraph.invalidate()
+
+    def _getFirstSetSuccessors(self, firstSet):
+
+        return self._successors
 
     def connect(self, successorElement):
 
@@ -412,6 +865,16 @@ class PlugNode(Node, Pluggable, Plug, GrammarElement):
 
         return successorElement
 
+class CommitNode(PlugNode):
+
+    def __init__(self):
+
+        PlugNode.__init__(self, Node.TECHNICAL)
+
+    def isCommitPoint(self):
+
+        return True
+
 class RuleStartNode(Node, IdNode):
 
     def __init__(self, ruleAccess, name, identifier):
@@ -424,12 +887,53 @@ class RuleStartNode(Node, IdNode):
         self._id = identifier
         
         self._start = None
+        self._expansions = None
 
     def getSuccessors(self, context):
         
         if not self._ruleAccess.dependsOnContext():
-            if self._start:
-                return [self._start]
+            if not self._start:
+                self._start = self._expand(None)
+            return [self._start]
+
+        key = self._ruleAccess.getExpansionKey(context)
+        if key is None:
+            return [self._expand(context)]
+
+        if self._expansions is None:
+            self._expansions = ExpansionCache(self._ruleAccess.getMaxExpansions())
+
+        start = self._expansions.get(key)
+        if start is None:
+            start = self._expand(context)
+            self._expansions.add(key, start)
+
+        return [start]
+
+    def getExpansionCache(self):
+
+        return self._expansions
+
+    def _probeContext(self):
+
+        probe = _ContextProbe()
+
+        try:
+            start = self._expand(probe)
+        except _ContextConsulted:
+            return True
+
+        # The expansion might have caught the exception or stored the probe:
+        consulted = probe.consulted
+        probe = weakref.ref(probe)
+        if consulted or probe() is not None:
+            return True
+
+        self._start = start
+
+        return False
+
+    def _expand(self, context):
 
         start = PlugNode(Node.TECHNICAL)
         end = PlugNode(Node.TECHNICAL)
@@ -437,16 +941,21 @@ class RuleStartNode(Node, IdNode):
         self._ruleAccess.onSuccRequested(start, end, context)
 
         end.connectTo(self._ruleAccess.getEndNode())
-        
-        if not self._ruleAccess.dependsOnContext():
-            self._start = start
 
-        return [start]
+        return start
 
     def getEnvVars(self):
 
         return self._ruleAccess.getEnvVars()
 
+    def _getFirstSetSuccessors(self, firstSet):
+
+        if self._ruleAccess.dependsOnContext():
+            return None
+
+        # Context independent rules do not consult the context:
+        return self.getSuccessors(None)
+
     def getName(self):
 
         return self._name
@@ -502,28 +1011,69 @@ class TokenNode(PlugNode, IdNode):
         if self._envVarUndoFunc:
             self._envVarUndoFunc(envVars, token, self)
 
+    def _getFirstSetSuccessors(self, firstSet):
+
+        firstSet.add(self.getTokenTypeId())
+
+        return []
+
 class _SwitchNode(Node):
 
-    def __init__(self, branches, end):
+    def __init__(self):
 
         Node.__init__(self, Node.TECHNICAL)
 
-        self._branches = branches
-        self._end = end
+        self._branches = [] # (keyword, entry node)
+        self._dispatch = {} # keyword id -> entry node
+
+    def addBranch(self, keyword, entry):
+
+        self._branches.append((keyword, entry))
+        self._dispatch[keyword.getId()] = entry
+
+    def getBranches(self):
+
+        return self._branches
 
     def getSuccessors(self, context):
 
-        keyword = context.getCurKeyword()
-        if not keyword:
-            return []
+        token = context.getToken()
+        if not token:
+            return self._getSuccessorsAtEnd()
 
-        try:
-            branch = self._branches[keyword]
-            start = connector()
-            start.connect(branch).connect(self._end)
-            return [start]
-        except KeyError:
-            return []
+        res = []
+        for typeId in token.getTypeIds():
+            entry = self._dispatch.get(typeId)
+            if entry is not None and entry not in res:
+                res.append(entry)
+
+        return res
+
+    def _getSuccessorsAtEnd(self):
+
+        return []
+
+    def _getFirstSetSuccessors(self, firstSet):
+
+        firstSet.update(self._dispatch)
+
+        return []
+
+class _KeywordForkNode(_SwitchNode):
+
+    def __init__(self):
+
+        _SwitchNode.__init__(self)
+
+        self._successors = []
+
+    def _getSuccessorsAtEnd(self):
+
+        return self._successors
+
+    def _getFirstSetSuccessors(self, firstSet):
+
+        return self._successors
 
 class _ConditionalNode(Node):
 
@@ -541,6 +1091,10 @@ class _ConditionalNode(Node):
         else:
             raise SuccessorError
 
+    def _getFirstSetSuccessors(self, firstSet):
+
+        return [self._end]
+
 class RuleInternalAccess(object):
 
     def __init__(self):
@@ -564,6 +1118,12 @@ class RuleInternalAccess(object):
     def dependsOnContext(self):
         raise NotImplementedError
 
+    def getExpansionKey(self, context):
+        raise NotImplementedError
+
+    def getMaxExpansions(self):
+        raise NotImplementedError
+
 class Multiplier(Connectable, Pluggable, GrammarElement):
 
     ZERO_TO_ONE = 1
@@ -669,3 +1229,269 @@ class Fork(Connectable, Pluggable, GrammarElement):
         self._end.connectTo(successorElement.getSocket())
 
         return successorElement
+
+class _GrammarCompiler(object):
+
+    TECHNICAL = 1
+    COMMIT = 2
+    TOKEN = 3
+    RULE_START = 4 # Occurrence of a context independent rule
+    RULE_END = 5
+    CONTEXT_RULE = 6 # Occurrence of a context dependent rule
+    SWITCH = 7
+    CONDITION = 8
+    KEYWORD_FORK = 9
+
+    # Rules without template key compiled per rule class at most:
+    MAX_RULES_PER_CLASS = 1000
+
+    def __init__(self, tokenTypes):
+
+        self._keywords = dict((tt.getId(), tt) for tt in tokenTypes
+                              if isinstance(tt, Keyword))
+        self._rows = []
+        self._indexes = {} # node -> row index
+        self._templates = {} # rule key -> start, end row index
+        self._numRules = {} # rule class -> rules without template key
+        self._pendingRules = []
+        self._pendingNodes = []
+
+    def compile(self, grammar):
+
+        res = self._addRow()
+        self._setRule(res, grammar, [])
+
+        while self._pendingRules:
+            self._compileRule(*self._pendingRules.pop())
+
+        return res
+
+    def getTable(self):
+
+        return tuple(tuple(row) for row in self._rows)
+
+    def _addRow(self, kind=None, successors=(), data=None):
+
+        self._rows.append([kind, successors, data])
+
+        return len(self._rows) - 1
+
+    def _getIndex(self, node):
+
+        if node not in self._indexes:
+            self._indexes[node] = self._addRow()
+            self._pendingNodes.append(node)
+
+        return self._indexes[node]
+
+    def _setRow(self, idx, kind, successors, data=None):
+
+        self._rows[idx] = [kind,
+                           tuple(self._getIndex(succ) for succ in successors),
+                           data]
+
+    def _setRule(self, idx, rule, returns):
+
+        returns = tuple(returns)
+
+        if rule.dependsOnContext():
+            self._rows[idx] = [self.CONTEXT_RULE, (), (_copyRule(rule), returns)]
+            return
+
+        key = _getRuleKey(rule)
+        if key not in self._templates:
+            if key is rule:
+                self._countRule(rule)
+            start = self._addRow()
+            end = self._addRow(self.RULE_END, (), _copyRule(rule))
+            self._templates[key] = start, end
+            self._pendingRules.append((rule, start, end))
+
+        start, end = self._templates[key]
+        self._rows[idx] = [self.RULE_START,
+                           (start,),
+                           (rule.getName(),
+                            rule.getSocket().getId(),
+                            dict(rule.getEnvVars()),
+                            end,
+                            returns)
+                           ]
+
+    def _countRule(self, rule):
+
+        num = self._numRules.get(rule.__class__, 0) + 1
+        if num > self.MAX_RULES_PER_CLASS:
+            raise Exception("Rule '%s' keeps creating new rules, "
+                            "declare a template key to compile it"
+                            % rule.getName())
+
+        self._numRules[rule.__class__] = num
+
+    def _compileRule(self, rule, startIdx, endIdx):
+
+        start = connector()
+        end = connector()
+        rule.onSuccRequested(start, end, None)
+
+        # What follows the rule depends on the occurrence, so the FIRST
+        # sets of nodes in front of the end must not be known:
+        end.connectTo(Node(Node.TECHNICAL))
+
+        self._indexes[start] = startIdx
+        self._indexes[end] = self._addRow(self.TECHNICAL, (endIdx,))
+        self._indexes[rule.getEndNode()] = endIdx
+        self._pendingNodes.append(start)
+
+        while self._pendingNodes:
+            node = self._pendingNodes.pop()
+            self._compileNode(node, self._indexes[node])
+
+    def _compileNode(self, node, idx):
+
+        if isinstance(node, RuleStartNode):
+            rule = node._ruleAccess
+            returns = [self._getIndex(succ)
+                       for succ in rule.getEndNode().getSuccessors(None)]
+            self._setRule(idx, rule, returns)
+        elif isinstance(node, TokenNode):
+            self._setRow(idx,
+                         self.TOKEN,
+                         node.getSuccessors(None),
+                         (node.getTokenType(),
+                          node.getId(),
+                          node._envVarChangeFunc,
+                          node._envVarUndoFunc)
+                         )
+        elif isinstance(node, CommitNode):
+            self._setRow(idx, self.COMMIT, node.getSuccessors(None))
+        elif isinstance(node, RuleEndNode):
+            raise Exception("Rule end of rule '%s' reached from outside"
+                            % node._ruleAccess.getName())
+        elif isinstance(node, PlugNode):
+            successors = node.getSuccessors(None)
+            branches = self._getKeywordBranches(successors)
+            if branches is not None:
+                self._setRow(idx, self.KEYWORD_FORK, successors, branches)
+            else:
+                self._setRow(idx, self.TECHNICAL, successors)
+        elif isinstance(node, _SwitchNode):
+            self._rows[idx] = [self.SWITCH,
+                               (),
+                               tuple((keyword, self._getIndex(entry))
+                                     for keyword, entry in node.getBranches())
+                               ]
+        elif isinstance(node, _ConditionalNode):
+            self._setRow(idx, self.CONDITION, [node._end], node._conditionFunc)
+        else:
+            raise Exception("Node of type %s cannot be compiled"
+                            % node.__class__.__name__)
+
+    def _getKeywordBranches(self, nodes):
+
+        if len(nodes) < 2:
+            return None
+
+        branches = {}
+
+        for node in nodes:
+            firstSet = node.getFirstSet()
+            if firstSet is None:
+                return None
+            for typeId in firstSet:
+                if typeId not in self._keywords or typeId in branches:
+                    return None
+                branches[typeId] = node
+
+        return tuple((self._keywords[typeId], self._getIndex(node))
+                     for typeId, node in sorted(branches.items()))
+
+def _getRuleKey(rule):
+
+    templateKey = rule.getTemplateKey()
+    if templateKey is None:
+        return rule
+
+    key = (templateKey,
+           rule.__class__,
+           rule.getName(),
+           tuple(sorted(rule.getEnvVars().items())))
+
+    try:
+        hash(key)
+    except TypeError:
+        return rule
+
+    return key
+
+def _copyRule(rule):
+
+    res = copy.copy(rule)
+    res._start = RuleStartNode(res, rule.getName(), rule.getSocket().getId())
+    res._end = RuleEndNode(res)
+    res._envVars = dict(rule.getEnvVars())
+
+    return res
+
+class _SharedRuleStartNode(Node, IdNode):
+
+    def __init__(self, name, identifier, envVars):
+
+        Node.__init__(self, Node.RULE_START)
+        IdNode.__init__(self)
+
+        self._name = name
+        self._id = identifier
+        self._envVars = envVars
+        self._successors = []
+        self._returns = [] # Successors of the rule end
+
+    def getSuccessors(self, context):
+
+        return self._successors
+
+    def getReturnSuccessors(self):
+
+        return self._returns
+
+    def getEnvVars(self):
+
+        # Each occurrence gets an environment of its own:
+        return dict(self._envVars)
+
+    def _getFirstSetSuccessors(self, firstSet):
+
+        return self._successors
+
+    def getName(self):
+
+        return self._name
+
+    def getId(self):
+
+        return self._id
+
+class _SharedRuleEndNode(Node):
+
+    def __init__(self, rule):
+
+        Node.__init__(self, Node.RULE_END)
+
+        self._rule = rule
+        self._callers = [] # Start nodes of all occurrences
+
+    def getSuccessors(self, context):
+
+        return context.getLastClosedRule().getReturnSuccessors()
+
+    def transform(self, astNode):
+
+        return self._rule.transform(astNode)
+
+    def _getFirstSetSuccessors(self, firstSet):
+
+        # Successors of all occurrences:
+        res = []
+        for caller in self._callers:
+            res.extend(caller.getReturnSuccessors())
+
+        return res
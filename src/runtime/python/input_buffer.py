@@ -14,73 +14,123 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .position import Position
-            
+from .position import Position, LineIndex
+
 class InputBuffer(object):
+    """
+    The buffered text is kept as one block with a read cursor. Positions
+    refer to the line index of all text read.
+    """
+
+    CHUNK_SIZE = 8192
+
+    def __init__(self, stream, fillSize = 1, chunkSize = CHUNK_SIZE, lineIndex = None):
 
-    def __init__(self, stream, fillSize = 1):
-         
         self._stream = stream
         self._fillSize = fillSize
-        
-        self._content = ""
-        self._position = Position()
-            
+        self._chunkSize = chunkSize
+
+        self._text = ""
+        self._cursor = 0
+        self._offset = 0
+        self._lineIndex = lineIndex or LineIndex()
+
     def setFillSize(self, newFillSize):
-        
+
         self._fillSize = newFillSize
-        
+
     def getContent(self):
 
-        self._fillContent()
-        
-        return self._content[0:self._fillSize]
+        return self.peek(self._fillSize)
 
     def getPositionInfo(self):
-        
-        return self._position.clone()
-    
+
+        return Position(self._lineIndex, self._offset)
+
+    def getLineIndex(self):
+
+        return self._lineIndex
+
+    def peek(self, n = 1):
+
+        if self._cursor + n > len(self._text):
+            self._fill(n)
+
+        return self._text[self._cursor:self._cursor + n]
+
+    def getBlock(self, minChars):
+        """
+        Returns the text block and the index of its first unconsumed
+        character. At least minChars characters are unconsumed unless the
+        input has ended.
+        """
+        self._fill(minChars)
+
+        return self._text, self._cursor
+
+    def consume(self, n = 1):
+
+        res = self.peek(n)
+
+        self._cursor += len(res)
+        self._offset += len(res)
+
+        return res
+
+    def consumeWhile(self, predicate):
+
+        parts = []
+
+        while True:
+
+            if self._cursor >= len(self._text) and not self._fill(1):
+                break
+
+            text = self._text
+            start = self._cursor
+            end = len(text)
+            idx = start
+            while idx < end and predicate(text[idx]):
+                idx += 1
+
+            if idx > start:
+                parts.append(text[start:idx])
+                self._cursor = idx
+
+            if idx < end:
+                break
+
+        res = "".join(parts)
+        self._offset += len(res)
+
+        return res
+
     def consumeChar(self):
-        
-        if self._content:
-            
-            ch = self._content[0]
-            
-            if len(self._content) > 1:
-                self._content = self._content[1:]
-            else:
-                self._content = ""
-                
-            self._fillContent()
-            
-            self._position.forwardChar(ch)
-                
-            return ch
-        
-        else:
-            
-            return ""
-        
+
+        return self.consume(1)
+
     def consumeAll(self):
-        
-        if len(self._content) <= self._fillSize:
-            
-            res = self._content
-            self._content = ""
-            
-        else:
-            
-            res = self._content[0:self._fillSize]
-            self._content = self._content[self._fillSize:]
-        
-        for ch in res:
-            self._position.forwardChar(ch)
-                
-        return res
 
-    def _fillContent(self):
+        return self.consume(self._fillSize)
+
+    def _fill(self, n):
 
-        while len(self._content) < self._fillSize:
-            if self._stream.endOfInput():
+        available = len(self._text) - self._cursor
+
+        if available >= n:
+            return available
+
+        parts = [self._text[self._cursor:]]
+
+        while available < n:
+            chunk = self._stream.readChunk(max(self._chunkSize, n - available))
+            if not chunk:
                 break
-            self._content += self._stream.getNextChar()
+            self._lineIndex.addText(chunk)
+            parts.append(chunk)
+            available += len(chunk)
+
+        self._text = "".join(parts)
+        self._cursor = 0
+
+        return available
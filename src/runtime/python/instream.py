@@ -14,6 +14,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import io
+import codecs
+import mmap
+
+DEFAULT_ENCODING = "utf-8"
+
 class InStream(object):
 
     def __init__(self):
@@ -25,6 +32,32 @@ class InStream(object):
     def endOfInput(self):
         return True
 
+    def readChunk(self, maxChars):
+        """
+        Subclasses should override this with a block-oriented version
+        """
+        chars = []
+
+        while len(chars) < maxChars and not self.endOfInput():
+            chars.append(self.getNextChar())
+
+        return "".join(chars)
+
+    def remaining(self):
+
+        return None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+
+        self.close()
+
 class StringInput(InStream):
 
     def __init__(self, text):
@@ -47,51 +80,215 @@ class StringInput(InStream):
 
         return self._idx >= len(self._text)
 
+    def readChunk(self, maxChars):
+
+        res = self._text[self._idx:self._idx + maxChars]
+        self._idx += len(res)
+
+        return res
+
+    def remaining(self):
+
+        return len(self._text) - self._idx
+
 class FileInput(InStream):
 
-    def  __init__(self, filePath):
+    BLOCK_SIZE = 65536
+
+    def  __init__(self, filePath, encoding=DEFAULT_ENCODING, blockSize=BLOCK_SIZE):
 
         InStream.__init__(self)
 
         self._filePath = filePath
-        self._lines = None
+        self._encoding = encoding
+        self._blockSize = blockSize
+        self._file = None
+        self._block = ""
+        self._idx = 0
+        self._numRead = 0
+        self._eof = False
 
     def endOfInput(self):
 
-        if self._lines is None:
-            self._read()
+        if self._idx < len(self._block):
+            return False
 
-        if self._curLineNum >= len(self._lines):
-            return True
-        else:
-            line = self._lines[self._curLineNum]
-            return self._curColumn >= len(line)
+        return not self._nextBlock()
 
     def getNextChar(self):
 
-        if self._lines is None:
-            self._read()
+        if self.endOfInput():
+            return ''
 
-        if not self.endOfInput():
-            line = self._lines[self._curLineNum]
-            res = line[self._curColumn]
-            self._next()
+        res = self._block[self._idx]
+        self._idx += 1
+
+        return res
+
+    def readChunk(self, maxChars):
+
+        if self._idx < len(self._block):
+            res = self._block[self._idx:self._idx + maxChars]
+            self._idx += len(res)
             return res
-        else:
+
+        return self._read(maxChars)
+
+    def remaining(self):
+
+        if self._eof:
+            return len(self._block) - self._idx
+
+        try:
+            size = os.path.getsize(self._filePath)
+        except OSError:
+            return None
+
+        return max(size - self._numRead, 0) + len(self._block) - self._idx
+
+    def close(self):
+
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _nextBlock(self):
+
+        self._block = self._read(self._blockSize)
+        self._idx = 0
+
+        return bool(self._block)
+
+    def _read(self, maxChars):
+
+        if self._eof:
+            return ""
+
+        if self._file is None:
+            self._file = open(self._filePath, "r", encoding=self._encoding)
+
+        res = self._file.read(maxChars)
+        self._numRead += len(res)
+
+        if not res:
+            self._eof = True
+            self.close()
+
+        return res
+
+class MmapFileInput(InStream):
+    """
+    Decodes a memory mapped file block by block. Line endings are
+    translated like in text mode.
+    """
+
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, filePath, encoding=DEFAULT_ENCODING, blockSize=BLOCK_SIZE):
+
+        InStream.__init__(self)
+
+        self._filePath = filePath
+        self._encoding = encoding
+        self._blockSize = blockSize
+        self._file = None
+        self._map = None
+        self._size = 0
+        self._offset = 0
+        self._decoder = None
+        self._block = ""
+        self._idx = 0
+        self._eof = False
+
+    def endOfInput(self):
+
+        if self._idx < len(self._block):
+            return False
+
+        return not self._nextBlock()
+
+    def getNextChar(self):
+
+        if self.endOfInput():
             return ''
 
-    def _next(self):
+        res = self._block[self._idx]
+        self._idx += 1
+
+        return res
+
+    def readChunk(self, maxChars):
+
+        if self.endOfInput():
+            return ""
+
+        res = self._block[self._idx:self._idx + maxChars]
+        self._idx += len(res)
+
+        return res
+
+    def remaining(self):
+
+        if self._file is None and not self._eof:
+            try:
+                return os.path.getsize(self._filePath)
+            except OSError:
+                return None
+
+        return self._size - self._offset + len(self._block) - self._idx
+
+    def close(self):
+
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+
+        self._file = open(self._filePath, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        if self._size > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        decoder = codecs.getincrementaldecoder(self._encoding)()
+        self._decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+
+    def _nextBlock(self):
+
+        self._block = ""
+        self._idx = 0
+
+        if self._eof:
+            return False
+
+        if self._file is None:
+            self._open()
+
+        while not self._block:
+
+            if self._offset >= self._size:
+                self._block = self._decoder.decode(b"", final=True)
+                self._eof = True
+                self.close()
+                break
+
+            data = self._map[self._offset:self._offset + self._blockSize]
+            self._offset += len(data)
+            self._block = self._decoder.decode(data)
+
+        return bool(self._block)
+
+MMAP_THRESHOLD = 64 * 1024 * 1024
 
-        line = self._lines[self._curLineNum]
-        self._curColumn += 1
-        if self._curColumn >= len(line):
-            self._curLineNum += 1
-            self._curColumn = 0
+def openFileInput(filePath, mmapThreshold=MMAP_THRESHOLD):
 
-    def _read(self):
+    if mmapThreshold is not None:
+        try:
+            if os.path.getsize(filePath) >= mmapThreshold:
+                return MmapFileInput(filePath)
+        except OSError:
+            pass
 
-        f = open(self._filePath, "r")
-        self._lines = f.readlines()
-        f.close()
-        self._curLineNum = 0
-        self._curColumn = 0
+    return FileInput(filePath)
@@ -15,9 +15,11 @@
 # limitations under the License.
 
 import re
+from collections import OrderedDict
 from .token import Token, Keyword, Word, Prefix, Postfix, Separator, Literal, MultiLineLiteral
 from .tokenizer import Tokenizer
 from .input_buffer import InputBuffer
+from .position import LineIndex
 from .util import DynamicObject
 
 class WSCharCode:
@@ -26,6 +28,7 @@ class WSCharCode:
     LINEBREAK =  10
     VTAB = 11
     FORMFEED = 12
+    CARRIAGE_RETURN = 13
     SPACE = 32
 
 class LexerMode:
@@ -36,7 +39,116 @@ class LexerMode:
     WSPACE = 4
     MULTI_LINE_LIT = 5
 
+class LexerStatistics(object):
+
+    def __init__(self):
+
+        self.configBuilds = 0
+        self.regexCompilations = 0
+        self.tokens = 0
+        self.cacheHits = 0
+        self.cacheMisses = 0
+
+class LexerConfig(object):
+
+    def __init__(self,
+                 statistics,
+                 wsChars,
+                 universalNewlines=False,
+                 lineCommentStart=None,
+                 blockCommentStart=None,
+                 blockCommentEnd=None,
+                 multiLineLitDelim=None,
+                 literalDelims=(),
+                 literalEscChar=None,
+                 separatorPatterns=None
+                 ):
+
+        self._statistics = statistics
+        statistics.configBuilds += 1
+
+        self.wsChars = frozenset(wsChars)
+        self.lineEnds = universalNewlines and "\r\n" or "\n"
+
+        self.lineCommentStart = lineCommentStart
+        self.blockCommentStart = blockCommentStart
+        self.blockCommentEnd = blockCommentEnd
+        self.multiLineLitDelim = multiLineLitDelim
+        self.literalDelims = tuple(literalDelims)
+        self.literalEscChar = literalEscChar
+
+        if literalEscChar:
+            self.literalEscapes = tuple([literalEscChar + delim for delim in literalDelims])
+        else:
+            self.literalEscapes = ()
+
+        fillSize = 2 # <-- needed to detect escape chars in literals
+        for delim in [self.lineCommentStart,
+                      self.blockCommentStart,
+                      self.blockCommentEnd,
+                      self.multiLineLitDelim]:
+            if delim and len(delim) > fillSize:
+                fillSize = len(delim)
+        self.fillSize = fillSize
+
+        if separatorPatterns is not None:
+            self.scannerRegex = self._compileScanner(separatorPatterns)
+        else:
+            self.scannerRegex = None
+
+    def _compile(self, pattern):
+
+        self._statistics.regexCompilations += 1
+
+        return re.compile(pattern)
+
+    def _compileScanner(self, separatorPatterns):
+
+        ws = "".join([re.escape(ch) for ch in sorted(self.wsChars)])
+        alternatives = [r"(?P<ws>[%s]+)" % ws]
+        stops = []
+
+        comments = []
+        if self.lineCommentStart:
+            start = re.escape(self.lineCommentStart)
+            comments.append(r"%s[^%s]*" % (start, re.escape(self.lineEnds)))
+            stops.append(start)
+        if self.blockCommentStart:
+            start = re.escape(self.blockCommentStart)
+            end = re.escape(self.blockCommentEnd)
+            comments.append(r"%s(?s:.*?)(?:%s|\Z)" % (start, end))
+            stops.append(start)
+        if comments:
+            alternatives.append(r"(?P<comment>%s)" % "|".join(comments))
+
+        if self.multiLineLitDelim:
+            delim = re.escape(self.multiLineLitDelim)
+            alternatives.append(r"(?P<mllit>%s(?s:.*?)(?:%s|\Z))" % (delim, delim))
+            stops.append(delim)
+
+        if self.literalDelims:
+            delims = [re.escape(delim) for delim in self.literalDelims]
+            escape = r"%s[%s]" % (re.escape(self.literalEscChar), "".join(delims))
+            literals = [r"%s(?s:%s|[^%s])*?(?:%s|\Z)" % (delim, escape, delim, delim)
+                        for delim in delims]
+            # Adjacent literals form one lexeme:
+            alternatives.append(r"(?P<lit>(?:%s)+)" % "|".join(literals))
+            stops += delims
+
+        for idx, pattern in enumerate(separatorPatterns):
+            alternatives.append(r"(?P<sep%d>%s)" % (idx, pattern))
+            stops.append(pattern)
+
+        if stops:
+            alternatives.append(r"(?P<word>(?:(?!%s)[^%s])+)" % ("|".join(stops), ws))
+        else:
+            alternatives.append(r"(?P<word>[^%s]+)" % ws)
+
+        return self._compile("|".join(alternatives))
+
 class Lexer(object):
+
+    WORD_CACHE_SIZE = 4096
     
     def __init__(self):
         
@@ -64,6 +176,15 @@ class Lexer(object):
         self._blockCommentEnabled = False
         self._blockCommentStart = ''
         self._blockCommentEnd = ''
+        self._tabSize = None
+        self._universalNewlines = False
+        self._scannerEnabled = False
+        self._config = None
+        self._statistics = LexerStatistics()
+        self._wordCache = OrderedDict()
+        self._wordCacheSize = self.WORD_CACHE_SIZE
+        self._typeMasks = {} # token type id -> bit
+        self._tokenMasks = {} # type ids of a token -> bits
         
     def setInputStream(self, instream):
         
@@ -78,6 +199,14 @@ class Lexer(object):
         
     def addTokenType(self, tt):
         
+        self._config = None
+        self._wordCache.clear()
+
+        # Dense bits, so that the masks stay small:
+        if tt.getId() not in self._typeMasks:
+            self._typeMasks[tt.getId()] = 1 << len(self._typeMasks)
+            self._tokenMasks.clear()
+
         if isinstance(tt, Keyword):
             self._keywords[tt.getKeyword()] = tt
         elif isinstance(tt, Word):
@@ -105,6 +234,7 @@ class Lexer(object):
 
         self._lineCommentEnabled = True
         self._lineCommentStart = lineCommentStart
+        self._config = None
 
     def enableBlockComments(self, 
                             blockCommentStart = "/*", 
@@ -114,17 +244,89 @@ class Lexer(object):
         self._blockCommentEnabled = True
         self._blockCommentStart = blockCommentStart
         self._blockCommentEnd = blockCommentEnd
+        self._config = None
+
+    def enableScanner(self, scanner = True):
+        """
+        Splits the input with one compiled regular expression instead of
+        the character based mode machine.
+        """
+        self._scannerEnabled = scanner
+        self._config = None
+
+    def getLineIndex(self):
+
+        return self._inputBuffer and self._inputBuffer.getLineIndex() or None
+
+    def getTypeMasks(self):
+
+        return self._typeMasks
+
+    def getStatistics(self):
+
+        return self._statistics
+
+    def resetStatistics(self):
+
+        self._statistics = LexerStatistics()
+        self._config = None
         
+    def setWordCacheSize(self, size):
+
+        self._wordCacheSize = size
+
+        while len(self._wordCache) > size:
+            self._wordCache.popitem(last=False)
+
+    def setTabSize(self, tabSize):
+
+        self._tabSize = tabSize
+
+    def enableUniversalNewlines(self, universalNewlines = True):
+
+        self._universalNewlines = universalNewlines
+
+        if universalNewlines:
+            if WSCharCode.CARRIAGE_RETURN not in self._wsCharCodes:
+                self._wsCharCodes.append(WSCharCode.CARRIAGE_RETURN)
+        elif WSCharCode.CARRIAGE_RETURN in self._wsCharCodes:
+            self._wsCharCodes.remove(WSCharCode.CARRIAGE_RETURN)
+
+        self._config = None
+
+    def iterTokens(self, instream):
+
+        self.setInputStream(instream)
+
+        token = self.getNextToken()
+        while token:
+            # Positions of later tokens are still resolved via the line index:
+            token.freezePositions()
+            self.getLineIndex().release(token.getEndOffset())
+            yield token
+            token = self.getNextToken()
+
     def getNextToken(self):
 
         if not self._instream:
             return None
 
         if self._stack:
-            return self._stack.pop()
+            return self._popToken()
 
         if not self._inputBuffer:
             self._initBuffer()
+        elif not self._config:
+            # Settings changed while reading the input:
+            self._buildConfig()
+            self._inputBuffer.setFillSize(self._config.fillSize)
+
+        if self._scannerEnabled:
+            self._stack = self._scanTokens()
+            if self._stack:
+                return self._popToken()
+            else:
+                return None
 
         hlp = self._getNextChars()
 
@@ -141,12 +343,28 @@ class Lexer(object):
             self._stack = [multiLineLit]
         
         if self._stack:
-            return self._stack.pop()
+            return self._popToken()
         else:
             msg = "Unknown token '" + tokenStr + "'";
             msg += " at line " + endPos.line + ", column " + endPos.column;
             raise Exception(msg)
   
+    def _popToken(self):
+
+        token = self._stack.pop()
+        self._statistics.tokens += 1
+
+        typeIds = token.getTypeIds()
+        mask = self._tokenMasks.get(typeIds)
+        if mask is None:
+            mask = 0
+            for typeId in typeIds:
+                mask |= self._typeMasks.get(typeId, 0)
+            self._tokenMasks[typeIds] = mask
+        token.setTypeMask(mask)
+
+        return token
+
     def _getNextChars(self):
 
         res = None
@@ -175,27 +393,96 @@ class Lexer(object):
         return res
 
     def _initBuffer(self):
-            
-        fillSize = 2 # <-- needed to detect escape chars in literals
-        
-        if self._multiLineLiteral:
-            minlen = len(self._multiLineLiteral.DELIMITER)
-            if minlen > fillSize:
-                fillSize = minlen 
-            
-        if self._lineCommentEnabled:
-            if len(self._lineCommentStart) > fillSize:
-                fillSize = len(self._lineCommentStart)
-
-        if self._blockCommentEnabled:
-            if len(self._blockCommentStart) > fillSize:
-                fillSize = len(self._blockCommentStart)
-            if len(self._blockCommentEnd) > fillSize:
-                fillSize = len(self._blockCommentEnd)
-    
-        self._inputBuffer = InputBuffer(self._instream, fillSize)
+
+        if not self._config:
+            self._buildConfig()
+
+        lineIndex = LineIndex(self._tabSize, self._universalNewlines)
+        self._inputBuffer = InputBuffer(self._instream, self._config.fillSize, lineIndex=lineIndex)
         self._consumed = ""
 
+    def _buildConfig(self):
+
+        if self._scannerEnabled:
+            separatorPatterns = [sep.getRegexIgnoreWS().pattern
+                                 for sep in self._tokenizer.get_separators()]
+        else:
+            separatorPatterns = None
+
+        self._config = LexerConfig(
+            self._statistics,
+            [chr(code) for code in self._wsCharCodes],
+            universalNewlines = self._universalNewlines,
+            lineCommentStart = self._lineCommentEnabled and self._lineCommentStart or None,
+            blockCommentStart = self._blockCommentEnabled and self._blockCommentStart or None,
+            blockCommentEnd = self._blockCommentEnabled and self._blockCommentEnd or None,
+            multiLineLitDelim = self._multiLineLiteral and self._multiLineLiteral.DELIMITER or None,
+            literalDelims = self._literal and self._literalDelims or (),
+            literalEscChar = self._literal and self._literalEscChar or None,
+            separatorPatterns = separatorPatterns
+            )
+
+    _SCAN_LOOKAHEAD = 256
+
+    def _scanTokens(self):
+
+        regex = self._config.scannerRegex
+        buf = self._inputBuffer
+
+        while True:
+
+            text, pos = buf.getBlock(self._SCAN_LOOKAHEAD)
+            available = len(text) - pos
+            if not available:
+                return []
+
+            # A match reaching the end of the buffered text might be
+            # continued by the next characters of the input:
+            match = regex.match(text, pos)
+            while not match or match.end() == len(text):
+                text, pos = buf.getBlock(2 * available)
+                if len(text) - pos <= available:
+                    break
+                available = len(text) - pos
+                match = regex.match(text, pos)
+
+            if not match:
+                errorPos = buf.getPositionInfo()
+                msg = "Unknown token '%s'" % text[pos:pos+1]
+                msg += " at line %d, column %d" % (errorPos.line, errorPos.column)
+                raise Exception(msg)
+
+            kind = match.lastgroup
+            start = buf.getPositionInfo()
+            lexeme = buf.consume(match.end() - pos)
+            end = buf.getPositionInfo()
+
+            if kind == "ws" or kind == "comment":
+                continue
+            elif kind == "word":
+                return self._getNonSepTokens(lexeme, end)
+            elif kind == "lit":
+                # Escape chars are dropped like in _consumeContent:
+                escChar = self._config.literalEscChar
+                for escape in self._config.literalEscapes:
+                    lexeme = lexeme.replace(escape, escape[len(escChar):])
+                return self._getNonSepTokens(lexeme, end)
+
+            if kind == "mllit":
+                token = self._multiLineLiteral.createToken(lexeme)
+            else:
+                token = Token(lexeme, [self._tokenizer.get_separators()[int(kind[3:])]])
+
+            if not token:
+                msg = "Unknown token '%s'" % lexeme
+                msg += " ending at line %d, column %d" % (end.line, end.column)
+                raise Exception(msg)
+
+            token.setStartPosition(start)
+            token.setEndPosition(end)
+
+            return [token]
+
     def _getNewMode(self, content):
 
         res = -1
@@ -231,52 +518,49 @@ class Lexer(object):
  
         return res;
     
-    def _startsWith(self, content, start):
-        
-        tmp = start.replace('*', '\\*')
-        regex = re.compile(r'\A%s' % tmp)
-        
-        return bool(regex.match(content))
-
     def _startsWS(self, content):
         
         if not self._currentLitDelim:
-            return ord(content[0]) in self._wsCharCodes
+            return content[0] in self._config.wsChars
         else:
             return False
         
     def _startsLineComment(self, content):
         
-        if self._lineCommentEnabled and not self._currentLitDelim:
-            return self._startsWith(content, self._lineCommentStart)
+        start = self._config.lineCommentStart
+        if start and not self._currentLitDelim:
+            return content.startswith(start)
         else:
             return False
 
     def _startsBlockComment(self, content):
         
-        if self._blockCommentEnabled and not self._currentLitDelim:
-            return self._startsWith(content, self._blockCommentStart)
+        start = self._config.blockCommentStart
+        if start and not self._currentLitDelim:
+            return content.startswith(start)
         else:
             return False
         
     def _startsMultiLineLiteral(self, content):
         
-        if self._multiLineLiteral:
-            return self._startsWith(content, self._multiLineLiteral.DELIMITER)
+        delim = self._config.multiLineLitDelim
+        if delim:
+            return content.startswith(delim)
         else:
             return False
         
     def _endsLineComment(self, content):
         
-        if self._lineCommentEnabled and not self._currentLitDelim:
-            return ord(content[0]) == WSCharCode.LINEBREAK
+        if self._config.lineCommentStart and not self._currentLitDelim:
+            return content[0] in self._config.lineEnds
         else:
             return False
 
     def _endsBlockComment(self, content):
         
-        if self._blockCommentEnabled and not self._currentLitDelim:
-            return self._startsWith(content, self._blockCommentEnd)
+        end = self._config.blockCommentEnd
+        if end and not self._currentLitDelim:
+            return content.startswith(end)
         else:
             return False
         
@@ -302,8 +586,7 @@ class Lexer(object):
                 
             savedPos = self._inputBuffer.getPositionInfo()
                 
-            for dummy in range(0, lenToConsume):
-                self._inputBuffer.consumeChar()
+            self._inputBuffer.consume(lenToConsume)
             
             if self._consumed:
                 res = DynamicObject()
@@ -313,8 +596,7 @@ class Lexer(object):
             self._consumed = ""
             if newMode == LexerMode.MULTI_LINE_LIT:
                 # multi-line-literal delimiter must be kept as part of the literal 
-                for _ in range(0, len(self._multiLineLiteral.DELIMITER)):
-                    self._consumed += self._inputBuffer.consumeChar()
+                self._consumed = self._inputBuffer.consume(len(self._multiLineLiteral.DELIMITER))
             
         elif self._mode == LexerMode.WSPACE:
             
@@ -324,27 +606,21 @@ class Lexer(object):
                     self._currentLitDelim = newChar
                 self._consumed += newChar
             elif newMode == LexerMode.LINE_COMMENT:
-                for dummy in range(0, len(self._lineCommentStart)):
-                    self._inputBuffer.consumeChar()
+                self._inputBuffer.consume(len(self._lineCommentStart))
             elif newMode == LexerMode.BLOCK_COMMENT:
-                for dummy in range(0, len(self._blockCommentStart)):
-                    self._inputBuffer.consumeChar()
+                self._inputBuffer.consume(len(self._blockCommentStart))
             elif newMode == LexerMode.MULTI_LINE_LIT:
-                self._consumed = ""
-                for _ in range(0, len(self._multiLineLiteral.DELIMITER)):
-                    self._consumed += self._inputBuffer.consumeChar()
+                self._consumed = self._inputBuffer.consume(len(self._multiLineLiteral.DELIMITER))
 
         elif self._mode == LexerMode.LINE_COMMENT:
             self._inputBuffer.consumeChar() # <-- consume linebreak '\n'
 
         elif self._mode == LexerMode.BLOCK_COMMENT:
-            for dummy in range(0, len(self._blockCommentEnd)):
-                self._inputBuffer.consumeChar()
+            self._inputBuffer.consume(len(self._blockCommentEnd))
                 
         elif self._mode == LexerMode.MULTI_LINE_LIT:
             
-            for _ in range(0, len(self._multiLineLiteral.DELIMITER)):
-                self._consumed += self._inputBuffer.consumeChar()
+            self._consumed += self._inputBuffer.consume(len(self._multiLineLiteral.DELIMITER))
                 
             res = DynamicObject()
             res.text = self._consumed
@@ -370,13 +646,7 @@ class Lexer(object):
                 else:
                     # Currently inside literal =>
                     # Check for escape characters and treat them separately:
-                    if self._literalEscChar:
-                        escChar = self._literalEscChar.replace("\\", "\\\\")
-                        for delim in self._literalDelims:
-                            regex = re.compile(r"\A%s%s.*" % (escChar, delim))
-                            if regex.match(content):
-                                escaped = True
-                                break                    
+                    escaped = content.startswith(self._config.literalEscapes)
                     
                     if content[0] == self._currentLitDelim:
                         self._currentLitDelim = ""
@@ -394,6 +664,14 @@ class Lexer(object):
             
             self._consumed += self._inputBuffer.consumeChar()
 
+        elif self._mode == LexerMode.WSPACE:
+
+            self._inputBuffer.consumeWhile(self._isWhiteSpace)
+
+        elif self._mode == LexerMode.LINE_COMMENT:
+
+            self._inputBuffer.consumeWhile(self._isNotLineBreak)
+
         else:
             
             self._inputBuffer.consumeChar()
@@ -495,21 +773,7 @@ class Lexer(object):
 
         # Find (key)words:
 
-        matchingWords = []
-
-        if text in self._keywords:
-            matchingWords = [self._keywords[text]]
-        else:
-            # perhaps case insensitive keyword?
-            tmp = text.upper()
-            if tmp in self._keywords:
-                kw = self._keywords[tmp]
-                if not kw.isCaseSensitive():
-                    matchingWords = [kw]
-
-        for word in self._words:
-            if word.matches(text):
-                matchingWords.append(word)
+        matchingWords = self._getMatchingWords(text)
 
         if matchingWords:
             
@@ -528,6 +792,50 @@ class Lexer(object):
 
         raise Exception(msg)
 
+    def _getMatchingWords(self, text):
+
+        try:
+            types, filtered = self._wordCache[text]
+            self._wordCache.move_to_end(text)
+            self._statistics.cacheHits += 1
+        except KeyError:
+            self._statistics.cacheMisses += 1
+            types, filtered = self._classifyWord(text)
+            if self._wordCacheSize > 0:
+                self._wordCache[text] = (types, filtered)
+                if len(self._wordCache) > self._wordCacheSize:
+                    self._wordCache.popitem(last=False)
+
+        if not filtered:
+            return list(types)
+
+        return [tt for tt in types if tt not in filtered or tt.acceptedByFilter(text)]
+
+    def _classifyWord(self, text):
+
+        matchingWords = []
+        filtered = []
+
+        if text in self._keywords:
+            matchingWords = [self._keywords[text]]
+        else:
+            # perhaps case insensitive keyword?
+            tmp = text.upper()
+            if tmp in self._keywords:
+                kw = self._keywords[tmp]
+                if not kw.isCaseSensitive():
+                    matchingWords = [kw]
+
+        for word in self._words:
+            if word.matchesPattern(text):
+                if not word.hasPureFilter():
+                    matchingWords.append(word)
+                    filtered.append(word)
+                elif word.acceptedByFilter(text):
+                    matchingWords.append(word)
+
+        return tuple(matchingWords), frozenset(filtered)
+
     def _isLiteralDelim(self, ch):
 
         return ch in self._literalDelims
@@ -535,10 +843,14 @@ class Lexer(object):
     def _isWhiteSpace(self, ch):
         
         if not self._currentLitDelim:
-            return ord(ch) in self._wsCharCodes
+            return ch in self._config.wsChars
         else:
             return False
 
+    def _isNotLineBreak(self, ch):
+
+        return ch not in self._config.lineEnds
+
 #        if self._isLiteralDelim(ch):
 #
 #            if self._currentLitDelim:
@@ -15,16 +15,68 @@
 # limitations under the License.
 
 from .lexer import Lexer
-from .instream import FileInput, StringInput
-from .token import Keyword
+from .instream import StringInput, openFileInput, MMAP_THRESHOLD
 from .grammar import SuccessorError
+from collections import OrderedDict
 import os
+import time
 
 class TreeCatg:
     
     PARSE_TREE = 1
     AST = 2
 
+class EventCatg:
+
+    RULE_START = 1
+    TOKEN = 2
+    RULE_END = 3
+
+class ParserStatistics(object):
+
+    def __init__(self):
+
+        self.nodeVisits = 0
+        self.prunedNodes = 0
+        self.backtrackSteps = 0
+        self.memoHits = 0
+        self.memoStores = 0
+        self.memoEvictions = 0
+
+class FailureMemo(object):
+
+    def __init__(self, maxEntries, statistics):
+
+        self._maxEntries = maxEntries
+        self._statistics = statistics
+        self._entries = OrderedDict()
+
+    def contains(self, key):
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._statistics.memoHits += 1
+            return True
+        else:
+            return False
+
+    def add(self, key):
+
+        self._entries[key] = True
+        self._statistics.memoStores += 1
+
+        if len(self._entries) > self._maxEntries:
+            self._entries.popitem(last=False)
+            self._statistics.memoEvictions += 1
+
+    def getSize(self):
+
+        return len(self._entries)
+
+DEFAULT_MAX_SEARCH_DEPTH = 10000
+DEFAULT_MEMO_SIZE = 100000
+LIMIT_CHECK_INTERVAL = 1000 # Node visits between two deadline checks
+
 class Parser(object):
     
     def __init__(self, grammar):
@@ -37,6 +89,17 @@ class Parser(object):
 
         self._curFile = None
         self._fullBacktracking = False
+        self._mmapThreshold = MMAP_THRESHOLD
+        self._firstSetPruning = True
+        self._pathCompaction = False
+        self._maxSearchDepth = DEFAULT_MAX_SEARCH_DEPTH
+        self._memoSize = 0
+        self._memo = None
+        self._maxBacktrackSteps = None
+        self._maxNodeVisits = None
+        self._timeout = None
+        self._nextLimitCheck = float('inf')
+        self._statistics = ParserStatistics()
 
     def enableLineComments(self, lineCommentStart='//'):
 
@@ -53,6 +116,66 @@ class Parser(object):
     def enableFullBacktracking(self, fullBacktracking=True):
         
         self._fullBacktracking = fullBacktracking
+
+    def enablePathCompaction(self, compaction=True):
+
+        self._pathCompaction = compaction
+
+    def enableFirstSetPruning(self, pruning=True):
+
+        self._firstSetPruning = pruning
+
+    def setMaxSearchDepth(self, maxDepth):
+
+        self._maxSearchDepth = maxDepth
+
+    def enableMemoization(self, memoization=True, maxEntries=DEFAULT_MEMO_SIZE):
+
+        self._memoSize = memoization and maxEntries or 0
+
+    def setParseLimits(self, maxBacktrackSteps=None, maxNodeVisits=None, timeout=None):
+        """
+        Limits the backtracking steps, grammar node visits and seconds
+        spent on a parse. Exceeding a limit raises a ParseLimitError.
+        """
+        self._maxBacktrackSteps = maxBacktrackSteps
+        self._maxNodeVisits = maxNodeVisits
+        self._timeout = timeout
+
+    def getStatistics(self):
+
+        return self._statistics
+
+    def resetStatistics(self):
+
+        self._statistics = ParserStatistics()
+
+    def enableScanner(self, scanner=True):
+
+        self._lexer.enableScanner(scanner)
+
+    def setWordCacheSize(self, size):
+
+        self._lexer.setWordCacheSize(size)
+
+    def getLexerStatistics(self):
+
+        return self._lexer.getStatistics()
+
+    def setTabSize(self, tabSize):
+
+        self._lexer.setTabSize(tabSize)
+
+    def enableUniversalNewlines(self, universalNewlines=True):
+        """
+        Lets "\r\n" and a single "\r" end a line when token lines are
+        computed
+        """
+        self._lexer.enableUniversalNewlines(universalNewlines)
+
+    def setMmapThreshold(self, threshold):
+
+        self._mmapThreshold = threshold
         
     def getTokenInfo(self, inStream):
         """
@@ -71,38 +194,171 @@ class Parser(object):
     
     def getTokenInfoFromFile(self, filePath):
         
-        return self.getTokenInfo(FileInput(filePath))
+        with openFileInput(filePath, self._mmapThreshold) as inStream:
+            return self.getTokenInfo(inStream)
     
     def getTokenInfoFromString(self, string):
         
         return self.getTokenInfo(StringInput(string))
 
+    def iterTokens(self, inStream):
+
+        return self._lexer.iterTokens(inStream)
+
+    def tokenizeFile(self, filePath):
+
+        with openFileInput(filePath, self._mmapThreshold) as inStream:
+            for token in self.iterTokens(inStream):
+                yield token
+
+    def tokenizeString(self, string):
+
+        return self.iterTokens(StringInput(string))
+
     def parse(self, inStream, treeCatg=TreeCatg.AST):
 
-        return self._createAst(self._getPath(inStream), treeCatg)
+        builder = AstBuilder(treeCatg)
 
-    def parseFile(self, filePath, treeCatg=TreeCatg.AST):
+        for node, token in self._iterFinalNodes(inStream):
+            builder.addNode(node, token)
 
-        self._curFile = filePath
+        return builder.getResult()
 
-        res = self.parse(FileInput(filePath), treeCatg)
+    def parseFile(self, filePath, treeCatg=TreeCatg.AST):
 
-        self._curFile = None
+        self._curFile = filePath
 
-        return res
+        try:
+            with openFileInput(filePath, self._mmapThreshold) as inStream:
+                return self.parse(inStream, treeCatg)
+        finally:
+            self._curFile = None
 
     def parseString(self, string, treeCatg=TreeCatg.AST):
 
         return self.parse(StringInput(string), treeCatg)
 
+    def iterParse(self, inStream, treeCatg=TreeCatg.AST):
+        """
+        Yields the top level items of the AST as soon as they are final
+        (see parseEvents). The items are transformed by their rules, the
+        grammar's own transformation is not applied.
+        """
+        builder = AstBuilder(treeCatg, detachItems=True)
+
+        for node, token in self._iterFinalNodes(inStream):
+            builder.addNode(node, token)
+            for item in builder.popItems():
+                yield item
+
+    def iterParseFile(self, filePath, treeCatg=TreeCatg.AST):
+
+        self._curFile = filePath
+
+        try:
+            with openFileInput(filePath, self._mmapThreshold) as inStream:
+                for item in self.iterParse(inStream, treeCatg):
+                    yield item
+        finally:
+            self._curFile = None
+
+    def iterParseString(self, string, treeCatg=TreeCatg.AST):
+
+        return self.iterParse(StringInput(string), treeCatg)
+
+    def parseEvents(self, inStream):
+        """
+        Yields a ParseEvent per rule start, matched token and rule end as
+        soon as the parser cannot backtrack into it anymore.
+        """
+        for node, token in self._iterFinalNodes(inStream):
+            yield self._createEvent(node, token)
+
+    def _iterFinalNodes(self, inStream):
+
+        emitted = 0
+        lastToken = None
+
+        for path, complete in self._iterPath(inStream, self._pathCompaction):
+
+            if complete:
+                end = path.getLength()
+            else:
+                end = 0
+                if not self._fullBacktracking and path.getLastRuleEnd() is not None:
+                    end = path.getLastRuleEnd() + 1
+                if path.getLastCommit() is not None:
+                    end = max(end, path.getLastCommit() + 1)
+                if end <= emitted:
+                    continue
+
+            for idx in range(emitted, end):
+                node = path.getGrammarNode(idx)
+                token = path.getToken(idx)
+                if token:
+                    token.freezePositions()
+                    lastToken = token
+                if node.isRuleStart() or node.isRuleEnd() or token:
+                    yield node, token
+            emitted = end
+
+            if not complete and end > 2:
+                # Keep the last two final nodes for backtracking:
+                path.discardPrefix(end - 2)
+                emitted = 2
+                # Positions after the final tokens are still resolved
+                # via the line index:
+                if lastToken:
+                    self._lexer.getLineIndex().release(lastToken.getEndOffset())
+
+            # The emitted nodes must keep their indexes:
+            path.protectPrefix(emitted)
+
+    def parseEventsFromFile(self, filePath):
+
+        self._curFile = filePath
+
+        try:
+            with openFileInput(filePath, self._mmapThreshold) as inStream:
+                for event in self.parseEvents(inStream):
+                    yield event
+        finally:
+            self._curFile = None
+
+    def parseEventsFromString(self, string):
+
+        return self.parseEvents(StringInput(string))
+
+    def _createEvent(self, node, token):
+
+        if node.isRuleStart():
+            return ParseEvent(EventCatg.RULE_START, node, token)
+        elif node.isRuleEnd():
+            return ParseEvent(EventCatg.RULE_END, node, token)
+        else:
+            return ParseEvent(EventCatg.TOKEN, node, token)
+
     def _getPath(self, inStream):
 
+        for path, complete in self._iterPath(inStream, self._pathCompaction):
+            pass
+
+        return path
+
+    def _iterPath(self, inStream, compaction=False):
+
         self._lexer.setInputStream(inStream)
         self._tokenBuffer = []
-        path = Path()
+        self._startLimits()
+        if self._memoSize:
+            self._memo = FailureMemo(self._memoSize, self._statistics)
+        else:
+            self._memo = None
+        path = Path(self._memo is not None and self._grammar.sharesRuleNodes())
         path.push(self._grammar.getSocket(), None)
         error = False
         done = False
+        compaction = compaction and not self._fullBacktracking
 
         while not done:
 
@@ -126,6 +382,9 @@ class Parser(object):
 
             if found:
                 self._tokenBuffer.pop()
+                if compaction:
+                    path.compact()
+                yield path, False
             else:
                 found, path = self._findNextSibling(path)
                 if not found:
@@ -133,7 +392,7 @@ class Parser(object):
                     error = True
 
         if not error:
-            return path
+            yield path, True
         else:
             if self._tokenBuffer:
                 token = self._tokenBuffer[0]
@@ -143,54 +402,51 @@ class Parser(object):
             else:
                 raise Exception("Parsing error")
 
-    def _createAst(self, path, treeCatg):
+    def _startLimits(self):
 
-        stack = []
-        current = None
+        stats = self._statistics
 
-        numElements = path.getLength()
+        if self._maxBacktrackSteps is not None:
+            self._backtrackLimit = stats.backtrackSteps + self._maxBacktrackSteps
+        else:
+            self._backtrackLimit = float('inf')
 
-        for i in range(numElements):
+        if self._maxNodeVisits is not None:
+            self._visitLimit = stats.nodeVisits + self._maxNodeVisits
+        else:
+            self._visitLimit = float('inf')
 
-            element = path.getElement(i)
-            node = element.getGrammarNode()
-            token = element.getToken()
+        if self._timeout is not None:
+            self._deadline = time.monotonic() + self._timeout
+        else:
+            self._deadline = None
 
-            if node.isRuleStart():
+        self._nextLimitCheck = stats.nodeVisits
+        self._checkLimits(None)
 
-                if current:
-                    stack.append(current)
-                name = node.getName()
-                id_ = node.getId()
-                text = token and token.getText() or ''
-                current = AstNode(name, text, id_, token)
+    def _checkLimits(self, path):
 
-            elif node.isRuleEnd():
+        visits = self._statistics.nodeVisits
 
-                if treeCatg == TreeCatg.AST:
-                    # Transform. Keep ID defined in rule.
-                    tmp = current;
-                    current = node.transform(current)
-                    if current is not tmp:
-                        current.setId(tmp.getId())
-
-                parent = stack and stack.pop() or None
-                if parent:
-                    parent.addChild(current)
-                    current = parent
-                else:
-                    break
+        if visits > self._visitLimit:
+            self._raiseLimitError(path, "Maximum of %d node visits exceeded"
+                                  % self._maxNodeVisits)
 
-            elif node.isTokenNode():
+        if self._deadline is not None:
+            if time.monotonic() > self._deadline:
+                self._raiseLimitError(path, "Timeout of %g seconds exceeded"
+                                      % self._timeout)
+            self._nextLimitCheck = min(self._visitLimit + 1,
+                                       visits + LIMIT_CHECK_INTERVAL)
+        else:
+            self._nextLimitCheck = self._visitLimit + 1
 
-                id_ = node.getId()
-                text = token and token.getText() or ''
-                current.addChild(AstNode('token', text, id_, token))
+    def _raiseLimitError(self, path, reason):
 
-            else:
-                continue
+        token = self._tokenBuffer and self._tokenBuffer[-1] or None
+        ruleStack = path and path.getRuleStack() or []
 
-        return current
+        raise ParseLimitError(self._curFile, token, reason, ruleStack)
 
     def _findNextSibling(self, path):
 
@@ -198,6 +454,10 @@ class Parser(object):
 
         while True:
 
+            if path.getGrammarNode(-1).isCommitPoint():
+                # No backtracking beyond a commit point:
+                return False, path
+
             if path.getLength() < 2:
                 # Restore original path:
                 while removed:
@@ -216,7 +476,7 @@ class Parser(object):
             else:
                 if not self._fullBacktracking:
                     # A backward navigation must not exit the current rule: 
-                    grammarNode = path.getElement(-1).getGrammarNode()
+                    grammarNode = path.getGrammarNode(-1)
                     if grammarNode.isRuleEnd():
                         return False, path
                 elem = path.pop()
@@ -230,11 +490,20 @@ class Parser(object):
         if path.getLength() < 2:
             return False, path
 
+        self._statistics.backtrackSteps += 1
+        if self._statistics.backtrackSteps > self._backtrackLimit:
+            self._raiseLimitError(path, "Maximum of %d backtracking steps exceeded"
+                                  % self._maxBacktrackSteps)
+
+        if self._memo and self._tokenBuffer:
+            # All continuations of the last element have failed:
+            self._addFailure(path, self._tokenBuffer[-1].getStartOffset())
+
         elem = path.pop()
         start = elem.getGrammarNode()
         token = elem.getToken()
 
-        prev = path.getElement(-1).getGrammarNode()
+        prev = path.getGrammarNode(-1)
         context = Context(path, token)
 
         try:
@@ -272,61 +541,223 @@ class Parser(object):
 
     def _findNextMatchingNode(self, token, path):
 
-        elem = path.getElement(-1)
-        startNode = elem.getGrammarNode()
-        startToken = elem.getToken()
+        return self._searchPath(path, token)
 
-        if startNode.isTokenNode() and startToken is None:
+    def _findPathToEnd(self, path):
 
-            if startNode.getTokenTypeId() in token.getTypeIds():
-                path.pop()
-                path.push(startNode, token)
-                return True, path
-            else:
-                return False, path
+        return self._searchPath(path, None)
 
-        try:
-            successors = startNode.getSuccessors(Context(path, token))
-        except SuccessorError:
+    def _searchPath(self, path, token):
+
+        stats = self._statistics
+        pruning = token is not None and self._firstSetPruning
+        memo = token is not None and self._memo or None
+        if token is not None:
+            typeIds = token.getTypeIds()
+            typeMask = token.getTypeMask()
+            typeMasks = self._lexer.getTypeMasks()
+            offset = token.getStartOffset()
+
+        pending = [] # Iterators over untried successors
+
+        if memo and self._isKnownFailure(path, offset):
             return False, path
 
-        for succ in successors:
+        while True:
 
-            path.push(succ, None)
+            stats.nodeVisits += 1
+            if stats.nodeVisits >= self._nextLimitCheck:
+                self._checkLimits(path)
+
+            node = path.getGrammarNode(-1)
+
+            if token is not None and node.isTokenNode() and path.getToken(-1) is None:
+
+                if typeMasks.get(node.getTokenTypeId(), 0) & typeMask:
+                    path.drop()
+                    path.push(node, token)
+                    return True, path
+                successors = None
 
-            found, path = self._findNextMatchingNode(token, path);
-            if found:
-                return found, path
             else:
-                path.pop()
 
-        return False, path
+                try:
+                    successors = node.getSuccessors(Context(path, token))
+                except SuccessorError:
+                    successors = None
+                else:
+                    if token is None and not successors:
+                        return True, path # Done!
+
+            if successors:
+                if len(pending) >= self._maxSearchDepth:
+                    raise SearchDepthError(self._curFile,
+                                           token,
+                                           self._maxSearchDepth,
+                                           path.getRuleStack())
+                pending.append(iter(successors))
+            else:
+                if memo:
+                    self._addFailure(path, offset)
+                if pending:
+                    path.drop()
+                else:
+                    return False, path
+
+            # Continue with the next untried successor:
+            succ = None
+            while succ is None:
+                for candidate in pending[-1]:
+                    if token is None:
+                        if candidate.isTokenNode():
+                            continue
+                    elif pruning:
+                        firstSet = candidate.getFirstSet()
+                        if firstSet is not None and firstSet.isdisjoint(typeIds):
+                            stats.prunedNodes += 1
+                            continue
+                    path.push(candidate, None)
+                    if memo and self._isKnownFailure(path, offset):
+                        path.drop()
+                        continue
+                    succ = candidate
+                    break
+                else:
+                    pending.pop()
+                    if memo:
+                        self._addFailure(path, offset)
+                    if not pending:
+                        return False, path
+                    path.drop()
 
-    def _findPathToEnd(self, path):
+    def _getMemoKey(self, path, offset):
 
-        node = path.getElement(-1).getGrammarNode()
-        try:
-            successors = node.getSuccessors(Context(path))
-        except SuccessorError:
-            return False, path
+        node = path.getGrammarNode(-1)
 
-        if not successors:
-            return True, path # Done!
+        # Token nodes are cheaper to match than to look up:
+        if node.isTokenNode() or path.getToken(-1):
+            return None
 
-        for succ in successors:
+        envSignature = path.getEnvSignature()
+        if envSignature is None:
+            return None
 
-            if succ.isTokenNode():
-                continue
+        return node.getTechnicalId(), offset, envSignature, path.getCallChainId()
 
-            path.push(succ, None)
+    def _isKnownFailure(self, path, offset):
 
-            found, path = self._findPathToEnd(path);
-            if found:
-                return found, path
+        key = self._getMemoKey(path, offset)
+
+        return key is not None and self._memo.contains(key)
+
+    def _addFailure(self, path, offset):
+
+        key = self._getMemoKey(path, offset)
+        if key is not None:
+            self._memo.add(key)
+
+class AstBuilder(object):
+
+    def __init__(self, treeCatg=TreeCatg.AST, detachItems=False):
+
+        self._treeCatg = treeCatg
+        self._detachItems = detachItems
+        self._items = []
+        self._stack = []
+        self._current = None
+        self._done = False
+
+    def addEvent(self, event):
+
+        self.addNode(event.getGrammarNode(), event.getToken())
+
+    def addNode(self, node, token):
+
+        if self._done:
+            return
+
+        if node.isRuleStart():
+
+            if self._current:
+                self._stack.append(self._current)
+            name = node.getName()
+            id_ = node.getId()
+            text = token and token.getText() or ''
+            self._current = AstNode(name, text, id_, token)
+
+        elif node.isRuleEnd():
+
+            current = self._current
+
+            # The children of the root are gone with detached items:
+            detached = self._detachItems and not self._stack
+
+            if self._treeCatg == TreeCatg.AST and not detached:
+                # Transform. Keep ID defined in rule.
+                tmp = current;
+                current = node.transform(current)
+                if current is not tmp:
+                    current.setId(tmp.getId())
+
+            parent = self._stack and self._stack.pop() or None
+            if parent:
+                self._addChild(parent, current)
+                self._current = parent
             else:
-                path.pop()
+                self._current = current
+                self._done = True
+
+        elif node.isTokenNode():
+
+            id_ = node.getId()
+            text = token and token.getText() or ''
+            self._addChild(self._current, AstNode('token', text, id_, token))
+
+    def _addChild(self, parent, child):
+
+        if self._detachItems and not self._stack:
+            self._items.append(child)
+        else:
+            parent.addChild(child)
+
+    def popItems(self):
+
+        res = self._items
+        self._items = []
+
+        return res
+
+    def getResult(self):
+
+        return self._current
+
+class ParseEvent(object):
+
+    def __init__(self, catg, grammarNode, token):
+
+        self._catg = catg
+        self._grammarNode = grammarNode
+        self._token = token
+
+    def getCatg(self):
+
+        return self._catg
+
+    def getGrammarNode(self):
+
+        return self._grammarNode
+
+    def getToken(self):
+
+        return self._token
+
+    def getName(self):
+
+        return self._grammarNode.getName()
+
+    def getId(self):
 
-        return False, path
+        return self._grammarNode.getId()
 
 class PathElement(object):
 
@@ -349,51 +780,184 @@ class PathElement(object):
 
 class Path(object):
 
-    def __init__(self):
+    COMPACTION_INTERVAL = 1024
+
+    def __init__(self, trackCallChains=False):
 
-        self._elements = []
-        self._envStack = [] # Stack of environments
+        self._nodes = []
+        self._tokens = []
+        self._scopes = [] # Environments of the rules entered but not left
+        self._closedScopes = [] # Environments of the rules left
+        self._openRules = [] # (start node, call chain id) of rules entered but not left
+        self._closedRules = [] # (start node, call chain id) of rules left
+        self._callChainIds = trackCallChains and {} or None # Tell apart occurrences of shared rule nodes
+        self._envSignature = None
+        self._compacted = 0 # Length of prefix not to be compacted anymore
+        self._lastRuleEnd = None
+        self._lastCommit = None
+        self._discardedRuleStack = [] # Rules open in discarded prefix
 
     def push(self, grammarNode, token):
 
-        self._elements.append(PathElement(grammarNode, token))
+        self._nodes.append(grammarNode)
+        self._tokens.append(token)
 
         if grammarNode.isRuleStart():
-            self._envStack.append(grammarNode.getEnvVars())
+            self._scopes.append(grammarNode.getEnvVars())
+            self._openRules.append((grammarNode, self._getCallChainId(grammarNode)))
+            self._envSignature = None
         elif grammarNode.isRuleEnd():
-            self._envStack.append(False)
+            self._closedScopes.append(self._scopes.pop())
+            self._closedRules.append(self._openRules.pop())
+            self._envSignature = None
+            self._lastRuleEnd = len(self._nodes) - 1
+        elif grammarNode.isCommitPoint():
+            self._lastCommit = len(self._nodes) - 1
         elif grammarNode.isTokenNode() and grammarNode.changesEnv():
-            envVars = self._getCurEnvVars()
-            if envVars is not None:
-                grammarNode.changeEnv(envVars, token)
+            if self._scopes:
+                grammarNode.changeEnv(self._scopes[-1], token)
+                self._envSignature = None
 
     def pop(self):
 
-        res = self._elements.pop()
+        return PathElement(*self._remove())
+
+    def drop(self):
+
+        self._remove()
 
-        node = res.getGrammarNode()
-        if node.isRuleStart() or node.isRuleEnd():
-            self._envStack.pop()
+    def _remove(self):
+
+        node = self._nodes.pop()
+        token = self._tokens.pop()
+
+        if node.isRuleStart():
+            self._scopes.pop()
+            self._openRules.pop()
+            self._envSignature = None
+        elif node.isRuleEnd():
+            self._scopes.append(self._closedScopes.pop())
+            self._openRules.append(self._closedRules.pop())
+            self._envSignature = None
+            self._lastRuleEnd = None
+        elif node.isCommitPoint():
+            self._lastCommit = None
         elif node.isTokenNode() and node.changesEnv():
-            envVars = self._getCurEnvVars()
-            if envVars is not None:
-                node.undoEnvChange(envVars, res.getToken())
+            if self._scopes:
+                node.undoEnvChange(self._scopes[-1], token)
+                self._envSignature = None
 
-        return res;
+        if len(self._nodes) < self._compacted:
+            self._compacted = len(self._nodes)
 
-    def popToken(self):
+        return node, token
+
+    def getLastRuleEnd(self):
+
+        return self._lastRuleEnd
+
+    def getLastCommit(self):
+
+        return self._lastCommit
+
+    def discardPrefix(self, length):
+
+        numRuleEnds = 0
+
+        for node in self._nodes[:length]:
+            if node.isRuleStart():
+                self._discardedRuleStack.append(node.getName())
+            elif node.isRuleEnd():
+                self._discardedRuleStack.pop()
+                numRuleEnds += 1
 
-        element = self.pop()
+        del self._nodes[:length]
+        del self._tokens[:length]
+        del self._closedScopes[:numRuleEnds]
+        del self._closedRules[:numRuleEnds]
 
-        return element.getToken()
+        self._compacted = max(self._compacted - length, 0)
+        if self._lastRuleEnd is not None:
+            self._lastRuleEnd -= length
+            if self._lastRuleEnd < 0:
+                self._lastRuleEnd = None
+        if self._lastCommit is not None:
+            self._lastCommit -= length
+            if self._lastCommit < 0:
+                self._lastCommit = None
+
+    def protectPrefix(self, length):
+
+        self._compacted = max(self._compacted, length)
+
+    def compact(self):
+        """
+        Without full backtracking the parser never returns to the
+        technical nodes in front of the last rule end.
+        """
+        if self._lastRuleEnd is None:
+            return
+
+        # Keep the node in front of the rule end for sibling lookups:
+        start = self._compacted
+        end = self._lastRuleEnd - 1
+        if self._lastCommit is not None:
+            end = min(end, self._lastCommit)
+        if end - start < self.COMPACTION_INTERVAL:
+            return
+
+        nodes = []
+        tokens = []
+        for idx in range(start, end):
+            node = self._nodes[idx]
+            if node.isRuleStart() or node.isRuleEnd() or node.isTokenNode():
+                nodes.append(node)
+                tokens.append(self._tokens[idx])
+
+        self._nodes[start:end] = nodes
+        self._tokens[start:end] = tokens
+        self._compacted = start + len(nodes)
+        self._lastRuleEnd -= end - self._compacted
+        if self._lastCommit is not None:
+            self._lastCommit -= end - self._compacted
+
+    def getRuleStack(self):
+
+        res = self._discardedRuleStack[:]
+
+        for node in self._nodes:
+            if node.isRuleStart():
+                res.append(node.getName())
+            elif node.isRuleEnd():
+                res.pop()
+
+        return res
+
+    def popToken(self):
+
+        return self._remove()[1]
 
     def getLength(self):
 
-        return len(self._elements)
+        return len(self._nodes)
 
     def getElement(self, index):
 
-        numElements = len(self._elements)
+        index = self._checkIndex(index)
+
+        return PathElement(self._nodes[index], self._tokens[index])
+
+    def getGrammarNode(self, index):
+
+        return self._nodes[self._checkIndex(index)]
+
+    def getToken(self, index):
+
+        return self._tokens[self._checkIndex(index)]
+
+    def _checkIndex(self, index):
+
+        numElements = len(self._nodes)
 
         if index < 0:
             index = numElements + index
@@ -401,49 +965,62 @@ class Path(object):
         if index < 0 or index > numElements - 1:
             raise Exception('Invalid path element index')
 
-        return self._elements[index]
+        return index
 
-    def getEnvVar(self, name):
+    def getLastClosedRule(self):
 
-        envVarStack = []
+        return self._closedRules[-1][0]
 
-        for env in self._envStack:
-            if not isinstance(env, bool):
-                envVarStack.append(env)
-            else:
-                envVarStack.pop()
+    def getCallChainId(self):
 
-        idx = len(envVarStack) - 1
-        while (idx > -1):
-            if name in envVarStack[idx]:
-                return envVarStack[idx][name]
-            idx -= 1
+        return self._openRules and self._openRules[-1][1] or 0
 
-        return None
+    def _getCallChainId(self, ruleStart):
 
-    def _getCurEnvVars(self):
+        if self._callChainIds is None:
+            return 0
 
-        idx = len(self._envStack) - 1
-        level = 0
-        while (idx >= 0):
-            envVars = self._envStack[idx]
-            if not isinstance(envVars, bool):
-                if level == 0:
-                    return envVars
-                level += 1
-            else:
-                level -= 1
-            idx -= 1
+        key = self.getCallChainId(), ruleStart.getTechnicalId()
+        if key not in self._callChainIds:
+            self._callChainIds[key] = len(self._callChainIds) + 1
+
+        return self._callChainIds[key]
+
+    def getEnvVar(self, name):
+
+        for envVars in reversed(self._scopes):
+            if name in envVars:
+                return envVars[name]
 
         return None
 
+    def getCurEnvVars(self):
+
+        if self._scopes:
+            return self._scopes[-1]
+        else:
+            return None
+
+    def getEnvSignature(self):
+
+        if self._envSignature is None:
+            # Shadowed values are visible again once the inner rule is left:
+            self._envSignature = tuple(tuple(sorted(envVars.items()))
+                                       for envVars in self._scopes)
+
+        try:
+            hash(self._envSignature)
+        except TypeError:
+            return None
+
+        return self._envSignature
+
     def __repr__(self):
 
         res = ""
 
-        for elem in self._elements:
+        for token in self._tokens:
 
-            token = elem.getToken()
             if token:
                 text = token.getText()
                 if res:
@@ -455,8 +1032,7 @@ class Path(object):
     def __str__(self):
 
         res = ''
-        for elem in self._elements:
-            node = elem.getGrammarNode()
+        for node in self._nodes:
             if res:
                 res += ':'
             res += "%d" % node.getTechnicalId()
@@ -513,16 +1089,16 @@ class Context(object):
 
         return self.getEnvVar(name)
 
+    def getLastClosedRule(self):
+
+        return self._path.getLastClosedRule()
+
     def getCurKeyword(self):
 
         if not self._token:
             return None
 
-        for tokenType in self._token.getTypes():
-            if isinstance(tokenType, Keyword):
-                return tokenType
-
-        return None
+        return self._token.getKeyword()
 
 class AstNode(object):
 
@@ -749,3 +1325,39 @@ class ParseError(Exception):
             res = 'File:"%s", ' % self.filePath + res
 
         return res
+
+class ParseLimitError(Exception):
+
+    def __init__(self, filePath, token, reason, ruleStack):
+
+        self.filePath = filePath
+        self.token = token
+        self.reason = reason
+        self.ruleStack = ruleStack
+
+    def __str__(self):
+
+        if self.token:
+            line, column = self.token.getStartPosition()
+            res = "Line:%d, Column:%d -> " % (line, column)
+            res += "%s at token '%s'" % (self.reason, self.token.getText())
+        else:
+            res = "%s at end of input" % self.reason
+
+        res += " (rules: %s)" % " > ".join(self.ruleStack)
+
+        if self.filePath:
+            res = 'File:"%s", ' % self.filePath + res
+
+        return res
+
+class SearchDepthError(ParseLimitError):
+
+    def __init__(self, filePath, token, maxDepth, ruleStack):
+
+        ParseLimitError.__init__(self,
+                                 filePath,
+                                 token,
+                                 "Search depth of %d exceeded" % maxDepth,
+                                 ruleStack)
+        self.maxDepth = maxDepth
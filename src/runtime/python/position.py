@@ -10,134 +10,235 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from bisect import bisect_left, bisect_right
+
+class LineIndex(object):
+    """
+    Line starts and tab offsets of an input text, shared by all its
+    positions
+    """
+
+    def __init__(self, tabSize=None, universalNewlines=False):
+
+        self._tabSize = tabSize
+        self._universalNewlines = universalNewlines
+        self._firstLine = 0 # Number of released lines
+        self._lineStarts = [0]
+        self._tabs = []
+        self._length = 0
+        self._pendingCR = False
+        self._cachedLine = (0, 0, 0) # (line start, next line start, line)
+
+    def getTabSize(self):
+
+        return self._tabSize or Position._TABSIZE
+
+    def addText(self, text):
+
+        if not text:
+            return
+
+        offset = self._length
+        newStarts = []
+
+        if self._universalNewlines:
+            if self._pendingCR and text[0] != "\n":
+                newStarts.append(offset)
+            self._pendingCR = text[-1] == "\r"
+            idx = text.find("\r")
+            while idx >= 0:
+                if idx + 1 < len(text) and text[idx + 1] != "\n":
+                    newStarts.append(offset + idx + 1)
+                idx = text.find("\r", idx + 1)
+
+        idx = text.find("\n")
+        while idx >= 0:
+            newStarts.append(offset + idx + 1)
+            idx = text.find("\n", idx + 1)
+
+        if self._universalNewlines:
+            newStarts.sort()
+        self._lineStarts.extend(newStarts)
+
+        idx = text.find("\t")
+        while idx >= 0:
+            self._tabs.append(offset + idx)
+            idx = text.find("\t", idx + 1)
+
+        self._length += len(text)
+
+    def getLength(self):
+
+        return self._length
+
+    def getNumLines(self):
+
+        return len(self._lineStarts)
+
+    def release(self, offset):
+        """
+        Drops the lines in front of the one containing offset. Positions
+        in front of that line cannot be resolved anymore.
+        """
+        idx = bisect_right(self._lineStarts, offset) - 1
+        if idx <= 0:
+            return
+
+        del self._lineStarts[:idx]
+        self._firstLine += idx
+        self._cachedLine = (0, 0, 0)
+
+        idx = bisect_left(self._tabs, self._lineStarts[0])
+        del self._tabs[:idx]
+
+    def getLine(self, offset):
+
+        lineStart, nextLineStart, line = self._cachedLine
+        if lineStart <= offset < nextLineStart:
+            return line
+
+        if offset < self._lineStarts[0]:
+            raise Exception("Line of offset %d has been released" % offset)
+
+        idx = bisect_right(self._lineStarts, offset)
+        line = self._firstLine + idx
+        if idx < len(self._lineStarts):
+            self._cachedLine = (self._lineStarts[idx - 1], self._lineStarts[idx], line)
+
+        return line
+
+    def getColumn(self, offset):
+
+        lineStart = self._lineStarts[self.getLine(offset) - 1 - self._firstLine]
+        tabSize = self.getTabSize()
+
+        first = bisect_left(self._tabs, lineStart)
+        last = bisect_left(self._tabs, offset, first)
+
+        column = 0
+        prev = lineStart
+        for idx in range(first, last):
+            tab = self._tabs[idx]
+            column += tab - prev
+            column = (column // tabSize + 1) * tabSize
+            prev = tab + 1
+        column += offset - prev
+
+        return 1 + column
+
 class Position(object):
-    
+
+    __slots__ = ('_index', '_offset', '_line', '_column')
+
     _TABSIZE = 4
-    
-    _NEW_LINE = 1
-    _TAB = 2
-    _OTHER_CHAR = 3
-        
-    def __init__(self, charGroups=None):
-        
-        self._charGrps = charGroups or []
-        self._cloned = False
-        
+
+    def __init__(self, lineIndex=None, offset=0):
+
+        if lineIndex is None:
+            lineIndex = LineIndex()
+
+        self._index = lineIndex
+        self._offset = offset
+        self._line = None
+        self._column = None
+
     def clone(self):
-        
-        res = Position(self._charGrps)
-        res._cloned = True
-        
-        self._cloned = True
-        
+
+        res = Position(self._index, self._offset)
+        res._line = self._line
+        res._column = self._column
+
         return res
-    
+
+    def freeze(self):
+
+        if self._index is not None:
+            self._line = self._index.getLine(self._offset)
+            self._column = self._index.getColumn(self._offset)
+            self._index = None
+
     @staticmethod
     def setTabSize(tabsize):
-        
+
         Position._TABSIZE = tabsize
-        
+
     def forwardChar(self, ch):
-        
-        if self._cloned:
-            self._copyOnWrite()
-            self._cloned = False
-        
-        if ch == "\n":
-            catg = self._NEW_LINE
-        elif ch == "\t":
-            catg = self._TAB
-        else:
-            catg = self._OTHER_CHAR
-            
-        if self._charGrps:
-            curGroup = self._charGrps[-1]
-            if curGroup[0] == catg:
-                curGroup[1] += 1
-            else:
-                self._charGrps.append([catg, 1])
-        else:
-            self._charGrps.append([catg, 1])
-            
+
+        self.forward(ch)
+
     def forward(self, text):
-        
-        for ch in text:
-            self.forwardChar(ch)
-            
+
+        size = len(text)
+        unindexed = self._offset + size - self._index.getLength()
+        if unindexed > 0:
+            self._index.addText(text[size - unindexed:])
+
+        self._offset += size
+
     def backwardChar(self):
 
-        if self._cloned:
-            self._copyOnWrite()
-            self._cloned = False
+        if self._offset > 0:
+            self._offset -= 1
 
-        if self._charGrps:
-            lastGrp = self._charGrps[-1]
-            lastGrp[1] -= 1
-            if lastGrp[1] == 0:
-                self._charGrps.pop()
-            
     def backward(self, text):
-        
-        for _ in range(0, len(text)):
-            self.backwardChar()
-                    
+
+        self._offset = max(self._offset - len(text), 0)
+
+    def getOffset(self):
+
+        return self._offset
+
+    offset = property(getOffset)
+
     def getLine(self):
-        
-        return 1 + sum([grp[1] for grp in self._charGrps if grp[0] == self._NEW_LINE])
-        
+
+        if self._index is None:
+            return self._line
+
+        return self._index.getLine(self._offset)
+
     line = property(getLine)
-    
+
     def getColumn(self):
-        
-        curLine = []
-        
-        for idx in range(len(self._charGrps), 0, -1):
-            grp = self._charGrps[idx-1]
-            if grp[0] != self._NEW_LINE:
-                curLine.insert(0, grp)
-            else:
-                break
-            
-        offset = 0
-        for grp in curLine:
-            if grp[0] == self._OTHER_CHAR:
-                offset += grp[1]
-            else:
-                for _ in range(0, grp[1]):
-                    offset = int(offset/self._TABSIZE + 1) * self._TABSIZE
-        
-        return 1 + offset
-    
+
+        if self._index is None:
+            return self._column
+
+        return self._index.getColumn(self._offset)
+
     column = property(getColumn)
-    
-    def _copyOnWrite(self):
-        
-        tmp = []
-        for grp in self._charGrps:
-            tmp.append(grp[:])
-            
-        self._charGrps = tmp
-    
+
+    def _cmp(self, other):
+
+        if self._index is other._index:
+            return self._offset - other._offset
+
+        line, otherLine = self.line, other.line
+        if line != otherLine:
+            return line - otherLine
+
+        return self.column - other.column
+
     def __lt__(self, other):
-        
-        return self.line < other.line or self.line == other.line and self.column < other.column
+
+        return self._cmp(other) < 0
 
     def __le__(self, other):
-        
-        return self.line < other.line or self.line == other.line and self.column <= other.column
-    
+
+        return self._cmp(other) <= 0
+
     def __eq__(self, other):
-        
-        return self.line == other.line and self.column == other.column
+
+        return self._cmp(other) == 0
 
     def __ne__(self, other):
-        
-        return self.line != other.line or self.column != other.column
+
+        return self._cmp(other) != 0
 
     def __gt__(self, other):
-        
-        return self.line > other.line or self.line == other.line and self.column > other.column
-    
+
+        return self._cmp(other) > 0
+
     def __ge__(self, other):
-        
-        return self.line > other.line or self.line == other.line and self.column >= other.column
+
+        return self._cmp(other) >= 0
@@ -15,7 +15,10 @@
 # limitations under the License.
 
 import re
-from .position import Position
+import sys
+import importlib
+import uuid
+import weakref
 
 class Token(object):
 
@@ -23,8 +26,17 @@ class Token(object):
 
         self._text = text
         self._types = types
-        self._start = Position()
-        self._end = Position()
+        self._start = None
+        self._end = None
+
+        # Precomputed for the parser which matches every token many times:
+        self._typeIds = tuple(type_.getId() for type_ in types)
+        self._typeMask = 0
+        self._keyword = None
+        for type_ in types:
+            if isinstance(type_, Keyword):
+                self._keyword = type_
+                break
 
     def getText(self):
 
@@ -32,19 +44,35 @@ class Token(object):
 
     def getTypeIds(self):
 
-        return [type_.getId() for type_ in self._types]
+        return self._typeIds
+
+    def setTypeMask(self, mask):
+
+        self._typeMask = mask
+
+    def getTypeMask(self):
+
+        return self._typeMask
 
     def getTypes(self):
 
         return self._types
 
+    def getKeyword(self):
+
+        return self._keyword
+
     def setStartPosition(self, pos):
 
         self._start = pos
 
     def getStartPosition(self):
 
-        return self._start.line, self._start.column
+        return self._lineAndColumn(self._start)
+
+    def getStartOffset(self):
+
+        return self._start and self._start.offset or 0
     
     def setEndPosition(self, pos):
         
@@ -52,7 +80,25 @@ class Token(object):
         
     def getEndPosition(self):
         
-        return self._end.line, self._end.column
+        return self._lineAndColumn(self._end)
+
+    def getEndOffset(self):
+
+        return self._end and self._end.offset or 0
+
+    def freezePositions(self):
+
+        if self._start:
+            self._start.freeze()
+        if self._end:
+            self._end.freeze()
+
+    def _lineAndColumn(self, pos):
+
+        if pos is None:
+            return 1, 1
+
+        return pos.line, pos.column
     
     def __str__(self):
         
@@ -73,6 +119,9 @@ class TokenType(object):
 
     currentId = 0
 
+    # Token types alive in this process by id:
+    _registry = weakref.WeakValueDictionary()
+
     def __init__(self):
 
         if self.__class__ == TokenType:
@@ -82,11 +131,26 @@ class TokenType(object):
         self._id = TokenType.currentId
         self.name = ""
         self._len = 0
+        self._module = _getDefiningModule(self)
+
+        TokenType._registry[self._id] = self
 
     def getId(self):
 
         return self._id
 
+    def __reduce__(self):
+        """
+        Unpickling returns the token type of the current process bound to
+        the same module global (or the same token type within the pickling
+        process), so that the ids agree.
+        """
+        return _restoreTokenType, (self.__class__,
+                                   _getTokenTypeState(self),
+                                   _getGlobalName(self),
+                                   (_PROCESS_KEY, self._id)
+                                   )
+
     def createToken(self, text):
 
         raise NotImplementedError
@@ -110,13 +174,17 @@ class TokenType(object):
 
 class Word(TokenType):
 
-    def __init__(self, pattern, filterCallback=None):
-
+    def __init__(self, pattern, filterCallback=None, pureFilter=False):
+        """
+        Results of a pure filter callback (pureFilter=True) are cached by
+        the lexer.
+        """
         TokenType.__init__(self)
 
         self._regex = re.compile(r"\A(%s)\Z" % pattern)
         self._len = len(pattern)
         self._filterCb = filterCallback
+        self._pureFilter = pureFilter
 
     def createToken(self, text):
         
@@ -137,9 +205,22 @@ class Word(TokenType):
         else:
             return False
         
-    def setFilterCallback(self, filterCallback):
+    def matchesPattern(self, text):
+
+        return bool(self._regex.match(text))
+
+    def acceptedByFilter(self, text):
+
+        return not self._filterCb or bool(self._filterCb(text))
+
+    def hasPureFilter(self):
+
+        return not self._filterCb or self._pureFilter
+
+    def setFilterCallback(self, filterCallback, pureFilter=False):
         
         self._filterCb = filterCallback
+        self._pureFilter = pureFilter
 
 class Keyword(TokenType):
 
@@ -368,3 +449,57 @@ class Separator(TokenType):
 
 class AbstractInstantiationError(Exception):
     pass
+
+# Distinguishes the ids of this process from those of others:
+_PROCESS_KEY = uuid.uuid4().hex
+
+def _getDefiningModule(tokenType):
+
+    frame = sys._getframe(1)
+    while frame and frame.f_locals.get("self") is tokenType:
+        frame = frame.f_back
+
+    return frame and frame.f_globals.get("__name__")
+
+def _getGlobalName(tokenType):
+
+    module = sys.modules.get(tokenType._module)
+    if module is None:
+        return None
+
+    for name, value in vars(module).items():
+        if value is tokenType:
+            return tokenType._module, name
+
+    return None
+
+def _getTokenTypeState(tokenType):
+
+    res = dict(tokenType.__dict__)
+    del res['_id']
+
+    return res
+
+def _restoreTokenType(cls, state, globalName=None, processId=None):
+
+    if globalName is not None:
+        moduleName, name = globalName
+        try:
+            res = getattr(importlib.import_module(moduleName), name, None)
+        except ImportError:
+            res = None
+        if res.__class__ is cls:
+            return res
+
+    if processId is not None and processId[0] == _PROCESS_KEY:
+        res = TokenType._registry.get(processId[1])
+        if res.__class__ is cls:
+            return res
+
+    res = cls.__new__(cls)
+    res.__dict__.update(state)
+    TokenType.currentId += 1
+    res._id = TokenType.currentId
+    TokenType._registry[res._id] = res
+
+    return res
@@ -14,7 +14,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
+from functools import cmp_to_key
+from .token import TokenType
+
 class Tokenizer(object):
+    """
+    Splits text at separators with one regular expression. Separators
+    inside literals are skipped.
+    """
 
     def __init__(self):
 
@@ -22,119 +30,82 @@ class Tokenizer(object):
         self._literalDelims = ['"', "'"]
         self._literalEscChar = '\\'
         self._separators = []
+        self._regex = None
 
     def set_literal(self, literal):
 
         self._literal = literal
         self._literalDelims = literal.DELIMITERS
         self._literalEscChar = literal.ESCAPE_CHAR
+        self._regex = None
 
     def add_separator(self, sep):
 
         self._separators.append(sep)
+        self._separators.sort(key=cmp_to_key(TokenType.compare))
+        self._regex = None
 
-    def split_at_separators(self, text):
-
-        worklist = [(text, None)]
-
-        for sep in self._separators:
-
-            tmp = []
-            for text_, sep_ in worklist:
-                if sep_:
-                    tmp.append((text_, sep_))
-                else:
-                    tmp += self._split_at_sep(text_, sep)
-
-            worklist = tmp
-
-        return worklist
-
-    def _split_at_sep(self, text, sep):
-
-        regex = sep.getRegexIgnoreWS()
-
-        sep_positions = []
-        for m in regex.finditer(text):
-            sep_positions.append((m.start(),m.end()))
+    def get_separators(self):
 
-        tmp = []
-        current = 0
-        for start, end in sep_positions:
-            substr = text[current:start]
-            if substr:
-                tmp.append((substr, None)) # None --> not a separator
-            tmp.append((text[start:end], sep))
-            current = end
+        return self._separators
 
-        substr = text[current:]
-        if substr:
-            tmp.append((substr, None))
-
-        res = self._unsplit_if_in_literal(tmp)
-
-        return res
-
-    def _unsplit_if_in_literal(self, split_result):
-
-        if not self._literal:
-            return split_result
-
-        tmp = []
-        last_idx = len(split_result) - 1
-
-        for idx, item in enumerate(split_result):
+    def split_at_separators(self, text):
 
-            substr, sep = item
+        if not self._separators:
+            return [(text, None)]
 
-            if sep is None:
-                tmp.append((substr, sep))
-                continue
-            
-            if idx > 0 and idx < last_idx:
-                left = "".join([el[0] for el in split_result[:idx]])
-                right = "".join([el[0] for el in split_result[idx+1:]])
-                if not self._is_in_literal(left, right):
-                    tmp.append((substr, sep))
-                else:
-                    tmp.append((substr, None))
-            else:
-                tmp.append((substr, sep))
+        if not self._regex:
+            self._regex = self._create_regex()
 
         res = []
-        buffer = ""
-        for substr, sep in tmp:
-            if sep is None:
-                buffer += substr
-            else:
-                if buffer:
-                    res.append((buffer, None))
-                    buffer = ""
-                res.append((substr, sep))
-        if buffer:
-            res.append((buffer, None))
+        current = 0 # <-- start of text not assigned to a part yet
+        start = 0
+
+        while True:
+
+            delim = ''
+            delim_pos = -1
+
+            for match in self._regex.finditer(text, start):
+                kind = match.lastgroup
+                if kind == "esc":
+                    continue
+                elif kind == "delim":
+                    ch = match.group()
+                    if not delim:
+                        delim = ch
+                        delim_pos = match.start()
+                    elif ch == delim:
+                        delim = ''
+                elif not delim:
+                    sep_start, sep_end = match.span()
+                    if sep_start > current:
+                        res.append((text[current:sep_start], None)) # None --> not a separator
+                    res.append((text[sep_start:sep_end], self._separators[int(kind[3:])]))
+                    current = sep_end
+
+            if not delim:
+                break
+
+            # Literal is not terminated => its delimiter is an ordinary character:
+            start = delim_pos + 1
+
+        if current < len(text):
+            res.append((text[current:], None))
 
         return res
 
-    def _is_in_literal(self, left, right):
+    def _create_regex(self):
 
-        for delim in self._literalDelims:
-            nleft = self._num_delim_occurrences(delim, left)
-            if nleft % 2 == 0:
-                continue
-            nright = self._num_delim_occurrences(delim, right)
-            if nright % 2 != 0:
-                return True
+        alternatives = []
 
-        return False
+        if self._literal:
+            delims = "".join([re.escape(delim) for delim in self._literalDelims])
+            if self._literalEscChar:
+                alternatives.append("(?P<esc>%s[%s])" % (re.escape(self._literalEscChar), delims))
+            alternatives.append("(?P<delim>[%s])" % delims)
 
-    def _num_delim_occurrences(self, delim, text):
+        for idx, sep in enumerate(self._separators):
+            alternatives.append("(?P<sep%d>%s)" % (idx, sep.getRegexIgnoreWS().pattern))
 
-        res = 0
-        prev = ''
-        for ch in text:
-            if ch == delim and (not prev or prev != self._literalEscChar):
-                res += 1
-            prev = ch
-
-        return res
+        return re.compile("|".join(alternatives))
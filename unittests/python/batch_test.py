@@ -0,0 +1,138 @@
+#! coding=UTF-8
+
+# Copyright 2012 Thomas Bollmeier <tbollmeier@web.de>
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import os
+import shutil
+import tempfile
+from runtime.python.batch import parseMany, toXml, main
+from runtime.python.parser import Parser
+from grammar import TestGrammar
+
+def createParser():
+
+    res = Parser(TestGrammar())
+    res.enableBlockComments()
+
+    return res
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self._dir = tempfile.mkdtemp()
+
+        testcode = os.path.abspath(os.path.dirname(__file__)) + os.sep + "testcode"
+        self._files = []
+        for idx in range(6):
+            filePath = os.path.join(self._dir, "code%d" % idx)
+            if idx == 3:
+                content = "forall a {\n  foreach b c {} }"
+            else:
+                content = open(testcode).read()
+            f = open(filePath, "w")
+            f.write(content)
+            f.close()
+            self._files.append(filePath)
+
+        self._expected = createParser().parseFile(testcode).toXml()
+
+    def tearDown(self):
+
+        shutil.rmtree(self._dir)
+
+    def testParseMany(self):
+
+        for workers in [0, 2]:
+
+            results = list(parseMany(self._files,
+                                     createParser,
+                                     workers=workers,
+                                     chunksize=2,
+                                     resultFunc=toXml))
+
+            self.assertEqual([res.filePath for res in results], self._files)
+            for idx, res in enumerate(results):
+                self.assertEqual(res.index, idx)
+                if idx == 3:
+                    self.assertFalse(res.isOk())
+                    self.assertEqual(res.error.errorType, "ParseError")
+                    self.assertEqual((res.error.line, res.error.column), (2, 13))
+                else:
+                    self.assertTrue(res.isOk())
+                    self.assertEqual(res.result, self._expected)
+
+    def testUnordered(self):
+
+        results = parseMany(self._files, TestGrammar, workers=2, ordered=False)
+        indexes = sorted(res.index for res in results if res.isOk())
+
+        self.assertEqual(indexes, [0, 1, 2, 4, 5])
+
+    def testMaxPending(self):
+
+        consumed = []
+
+        def iterFiles():
+
+            for filePath in self._files:
+                consumed.append(filePath)
+                yield filePath
+
+        for ordered in [True, False]:
+            del consumed[:]
+            results = parseMany(iterFiles(), TestGrammar, workers=2, ordered=ordered,
+                                maxPending=2)
+            next(results)
+            self.assertTrue(len(consumed) <= 3)
+            self.assertEqual(len(list(results)), 5)
+
+    def testCommandLine(self):
+
+        outDir = os.path.join(self._dir, "out")
+        os.mkdir(outDir)
+
+        args = ["-p", "batch_test:createParser", "-o", outDir, "-j", "2"]
+        self.assertEqual(main(args + self._files), 1)
+        self.assertEqual(main(args + self._files[:2]), 0)
+
+        f = open(os.path.join(outDir, "code0.xml"))
+        self.assertEqual(f.read(), self._expected)
+        f.close()
+        self.assertFalse(os.path.exists(os.path.join(outDir, "code3.xml")))
+
+    def testCommandLineSameNames(self):
+
+        outDir = os.path.join(self._dir, "out")
+        os.mkdir(outDir)
+        for name in ["a", "b"]:
+            os.mkdir(os.path.join(self._dir, name))
+            shutil.copy(self._files[0], os.path.join(self._dir, name, "code"))
+        with open(os.path.join(self._dir, "b", "code"), "a") as f:
+            f.write(" forall x {}")
+
+        args = ["-p", "batch_test:createParser", "-o", outDir, "-j", "2"]
+        self.assertEqual(main(args + [os.path.join(self._dir, name, "code")
+                                      for name in ["a", "b"]]), 0)
+
+        with open(os.path.join(outDir, "a", "code.xml")) as f:
+            self.assertEqual(f.read(), self._expected)
+        with open(os.path.join(outDir, "b", "code.xml")) as f:
+            self.assertNotEqual(f.read(), self._expected)
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -15,7 +15,7 @@
 # limitations under the License.
 
 from runtime.python.token import *
-from runtime.python.grammar import Grammar, defineRule, expand, transform, tokenNode as tn, connector
+from runtime.python.grammar import Grammar, Rule, defineRule, initialize, expand, transform, tokenNode as tn, connector, commit, Switch
 from runtime.python.parser import AstNode
 
 token_types = []
@@ -70,6 +70,29 @@ def for_expand(start, end, context):
     
     _end.connect(tn(BRACE_CLOSE)).connect(end)
 
+LoopRule = defineRule("Loop")
+
+@initialize(LoopRule)
+def loop_init(rule):
+
+    rule.setContextIndependent()
+
+@expand(LoopRule)
+def loop_expand(start, end, context):
+
+    _start = connector()
+
+    start\
+    .connect(tn(FORALL))\
+    .connect(tn(ID, 'list'))\
+    .connect(tn(BRACE_OPEN))\
+    .connect(_start)
+
+    _start.connect(LoopRule()).connect(_start)
+    _start.connect(Switch({FOREACH: ForRule()})).connect(_start)
+    _start.connect(tn(BRACE_CLOSE)).connect(end)
+
+@transform(LoopRule)
 @transform(ForRule)
 def for_transform(astNode):
 
@@ -96,3 +119,139 @@ class TestGrammar(Grammar):
     def transform(self, astNode):
 
         return astNode
+
+class FirstItemGrammar(TestGrammar):
+
+    def transform(self, astNode):
+
+        return astNode.getChildren()[0]
+
+CHAIN_LENGTH = 3000
+
+ChainRule = defineRule("Chain")
+
+@expand(ChainRule)
+def chain_expand(start, end, context):
+
+    # Long chain of technical nodes in front of the token:
+    node = start
+    for i in range(CHAIN_LENGTH):
+        node = node.connect(connector())
+
+    node.connect(tn(ID, 'id')).connect(end)
+
+class ChainGrammar(Grammar):
+
+    def __init__(self):
+
+        Grammar.__init__(self, token_types)
+
+    def expand(self, start, end, context):
+
+        start.connect(ChainRule()).connect(end)
+
+ItemRule = defineRule("Item")
+
+@expand(ItemRule)
+def item_expand(start, end, context):
+
+    start.connect(tn(ID)).connect(end)
+    start.connect(tn(ID)).connect(tn(ID)).connect(end)
+
+class ListGrammar(Grammar):
+    """
+    Ambiguous list of identifiers terminated by a closing brace
+    """
+
+    def __init__(self):
+
+        Grammar.__init__(self, token_types)
+
+    def expand(self, start, end, context):
+
+        loop = connector()
+
+        start.connect(loop)
+        loop.connect(ItemRule()).connect(loop)
+        loop.connect(tn(BRACE_CLOSE)).connect(end)
+
+class CommitGrammar(Grammar):
+    """
+    Sequence of for loops with a commit point after each loop
+    """
+
+    def __init__(self):
+
+        Grammar.__init__(self, token_types)
+
+    def expand(self, start, end, context):
+
+        start.connect(ForRule()).connect(commit()).connect(start)
+        start.connect(end)
+
+class AlternativesGrammar(Grammar):
+    """
+    Two identifiers. The first alternative expects three of them and
+    - if requested - commits to its choice after the first one.
+    """
+
+    def __init__(self, withCommit):
+
+        Grammar.__init__(self, token_types)
+
+        self._withCommit = withCommit
+
+    def expand(self, start, end, context):
+
+        first = start.connect(tn(ID))
+        if self._withCommit:
+            first = first.connect(commit())
+        first.connect(tn(ID)).connect(tn(ID)).connect(end)
+
+        start.connect(tn(ID)).connect(tn(ID)).connect(end)
+
+class LoopGrammar(Grammar):
+    """
+    Rules declared context independent (forall loops) mixed with
+    rules probed for their context dependence (foreach loops)
+    """
+
+    def __init__(self):
+
+        Grammar.__init__(self, token_types)
+
+        self.setContextIndependent()
+
+    def expand(self, start, end, context):
+
+        start.connect(LoopRule()).connect(start)
+        start.connect(Switch({FOREACH: ForRule()})).connect(start)
+        start.connect(end)
+
+KW_A = Keyword("a")
+KW_B = Keyword("b")
+
+class KeywordRule(Rule):
+    """
+    Keyword followed by an identifier
+    """
+
+    def __init__(self, keyword):
+
+        Rule.__init__(self)
+
+        self._keyword = keyword
+
+    def expand(self, start, end, context):
+
+        start.connect(tn(self._keyword)).connect(tn(ID)).connect(end)
+
+class KeywordGrammar(Grammar):
+
+    def __init__(self):
+
+        Grammar.__init__(self, [KW_A, KW_B, ID])
+
+    def expand(self, start, end, context):
+
+        start.connect(KeywordRule(KW_A)).connect(KeywordRule(KW_B)).connect(end)
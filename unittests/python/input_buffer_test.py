@@ -0,0 +1,172 @@
+#! coding=UTF-8
+
+# Copyright 2012 Thomas Bollmeier <tbollmeier@web.de>
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#   http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import os
+import tempfile
+
+from runtime.python.input_buffer import InputBuffer
+from runtime.python.instream import InStream, StringInput, FileInput, MmapFileInput
+from runtime.python.position import LineIndex
+
+class InputBufferTest(unittest.TestCase):
+
+    def testPeekAndConsume(self):
+
+        buf = InputBuffer(StringInput("foreach x in list"), 2, chunkSize=3)
+
+        self.assertEqual(buf.getContent(), "fo")
+        self.assertEqual(buf.peek(7), "foreach")
+        self.assertEqual(buf.consume(7), "foreach")
+        self.assertEqual(buf.consumeChar(), " ")
+        self.assertEqual(buf.consumeWhile(lambda ch: ch != " "), "x")
+        self.assertEqual(buf.consume(100), " in list")
+        self.assertEqual(buf.getContent(), "")
+        self.assertEqual(buf.consumeChar(), "")
+
+    def testPositionInfo(self):
+
+        buf = InputBuffer(StringInput("ab\ncd"), chunkSize=2)
+
+        buf.consumeWhile(lambda ch: ch != "d")
+        pos = buf.getPositionInfo()
+
+        self.assertEqual(pos.line, 2)
+        self.assertEqual(pos.column, 2)
+
+    def testLineIndex(self):
+
+        buf = InputBuffer(StringInput("a\tb\n\tc\td\n"), chunkSize=4)
+
+        buf.consume(3)
+        pos = buf.getPositionInfo()
+        buf.consume(100)
+
+        self.assertEqual((pos.line, pos.column), (1, 6))
+        pos.forward("\n\tc\t")
+        self.assertEqual((pos.line, pos.column), (2, 9))
+        pos.backward("\tc\t")
+        self.assertEqual((pos.line, pos.column), (2, 1))
+        self.assertEqual(pos.offset, 4)
+        self.assertEqual(buf.getLineIndex().getLine(buf.getPositionInfo().offset), 3)
+
+    def testLineIndexRelease(self):
+
+        index = LineIndex(4)
+        index.addText("abcdef\n\tghij\nklm\n\tnop\nqrs")
+
+        # Offset 7 is in line 2, whose line is cached now:
+        self.assertEqual((index.getLine(7), index.getColumn(7)), (2, 1))
+
+        index.release(20)
+        self.assertEqual(index.getNumLines(), 2)
+        with self.assertRaises(Exception) as cm:
+            index.getColumn(7)
+        self.assertIn("released", str(cm.exception))
+        self.assertRaises(Exception, index.getLine, 16)
+
+        self.assertEqual((index.getLine(17), index.getColumn(17)), (4, 1))
+        self.assertEqual((index.getLine(18), index.getColumn(18)), (4, 5))
+        self.assertEqual((index.getLine(22), index.getColumn(22)), (5, 1))
+
+class InStreamTest(unittest.TestCase):
+
+    def testFileInputBlocks(self):
+
+        with open("multi-line-lit.txt") as f:
+            expected = f.read()
+
+        instream = FileInput("multi-line-lit.txt", blockSize=4)
+
+        self.assertEqual(instream.getNextChar(), expected[0])
+        text = instream.getNextChar()
+        chunk = instream.readChunk(5)
+        while chunk:
+            text += chunk
+            chunk = instream.readChunk(5)
+
+        self.assertEqual(text, expected[1:])
+        self.assertTrue(instream.endOfInput())
+        self.assertEqual(instream.remaining(), 0)
+
+    def testFileInputClose(self):
+
+        text = "Grüße\nzwei"
+        fd, filePath = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(text.encode("utf-8"))
+
+        try:
+            # Same default encoding as MmapFileInput:
+            with FileInput(filePath, blockSize=3) as instream:
+                self.assertEqual(instream.readChunk(3), "Grü")
+                self.assertIsNotNone(instream._file)
+            self.assertIsNone(instream._file)
+        finally:
+            os.remove(filePath)
+
+    def testStringInputChunks(self):
+
+        instream = StringInput("abcdef")
+
+        self.assertEqual(instream.readChunk(4), "abcd")
+        self.assertEqual(instream.remaining(), 2)
+        self.assertEqual(instream.getNextChar(), "e")
+        self.assertEqual(instream.readChunk(4), "f")
+        self.assertEqual(instream.readChunk(4), "")
+
+    def testMmapFileInput(self):
+
+        text = "Grüße\r\n€ uno\r\nzwei"
+        fd, filePath = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(text.encode("utf-8"))
+
+        try:
+            # Block size forces multi-byte characters to cross block borders:
+            instream = MmapFileInput(filePath, blockSize=3)
+            res = ""
+            chunk = instream.readChunk(2)
+            while chunk:
+                res += chunk
+                chunk = instream.readChunk(2)
+        finally:
+            os.remove(filePath)
+
+        self.assertEqual(res, "Grüße\n€ uno\nzwei")
+        self.assertTrue(instream.endOfInput())
+
+    def testDefaultReadChunk(self):
+
+        class CharInput(InStream):
+
+            def __init__(self, text):
+                InStream.__init__(self)
+                self._chars = list(text)
+
+            def getNextChar(self):
+                return self._chars.pop(0)
+
+            def endOfInput(self):
+                return not self._chars
+
+        buf = InputBuffer(CharInput("foreach x"), chunkSize=4)
+
+        self.assertEqual(buf.consume(20), "foreach x")
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -18,7 +18,7 @@ import unittest
 import sys
 import os
 
-from runtime.python.token import Literal, Word, Separator, MultiLineLiteral
+from runtime.python.token import Literal, Word, Keyword, Separator, MultiLineLiteral
 from runtime.python.lexer import Lexer
 from runtime.python.instream import StringInput, FileInput
 
@@ -98,6 +98,112 @@ class LexerTest(unittest.TestCase):
         lastText = tokens[-1].getText()
         self.assertEqual(lastText, "street")
         
+    def testLongestSeparatorFirst(self):
+
+        self._lexer.addTokenType(Separator('=='))
+
+        code = "a==b;c='x==y'+d.e=f"
+
+        texts = [token.getText() for token in self._lexer.iterTokens(StringInput(code))]
+
+        self.assertEqual(texts, ["a", "==", "b", ";", "c", "=", "'x==y'", "+", "d", ".", "e", "=", "f"])
+
+    def testReleaseLines(self):
+
+        numLines = 0
+        for token in self._lexer.iterTokens(StringInput("a b\n" * 10000)):
+            numLines = max(numLines, self._lexer.getLineIndex().getNumLines())
+
+        # The input is read in chunks of a few thousand characters:
+        self.assertTrue(numLines < 3000)
+        self.assertEqual(token.getStartPosition(), (10000, 3))
+
+    def testUniversalNewlines(self):
+
+        self._lexer.enableUniversalNewlines()
+
+        code = "a # comment\rb # comment\r\nc"
+
+        texts = [token.getText() for token in self._lexer.iterTokens(StringInput(code))]
+
+        self.assertEqual(texts, ["a", "b", "c"])
+
+    def testChangeWhileReading(self):
+
+        self._lexer.setInputStream(StringInput("a b-c -- d"))
+        texts = [self._lexer.getNextToken().getText()]
+
+        self._lexer.addTokenType(Separator('-'))
+        self._lexer.enableLineComments('--')
+        token = self._lexer.getNextToken()
+        while token:
+            texts.append(token.getText())
+            token = self._lexer.getNextToken()
+
+        self.assertEqual(texts, ["a", "b", "-", "c"])
+
+    def testTokenTypeMask(self):
+
+        var = Keyword('var')
+        name = Word('[a-z]+')
+        self._lexer.addTokenType(var)
+        self._lexer.addTokenType(name)
+
+        tokens = list(self._lexer.iterTokens(StringInput("var x;")))
+        masks = self._lexer.getTypeMasks()
+
+        # One bit per token type of the lexer:
+        self.assertEqual(sorted(masks.values()), [1 << idx for idx in range(len(masks))])
+        self.assertTrue(tokens[0].getTypeMask() & masks[var.getId()])
+        self.assertIs(tokens[0].getKeyword(), var)
+        self.assertTrue(tokens[1].getTypeMask() & masks[name.getId()])
+        self.assertFalse(tokens[1].getTypeMask() & masks[var.getId()])
+        self.assertIsNone(tokens[1].getKeyword())
+
+    def testStatistics(self):
+
+        code = "person.getAddress().street; # comment\n" * 50
+
+        for _ in range(2):
+            self._lexer.setInputStream(StringInput(code))
+            token = self._lexer.getNextToken()
+            while token:
+                token = self._lexer.getNextToken()
+
+        stats = self._lexer.getStatistics()
+
+        # Matchers are built once, not per character or per input:
+        self.assertEqual(stats.configBuilds, 1)
+        self.assertLessEqual(stats.regexCompilations, 1)
+        self.assertEqual(stats.tokens, 800)
+
+    def testWordCache(self):
+
+        calls = []
+        def filterCb(text):
+            calls.append(text)
+            return text != "x"
+
+        pure = Word('[0-9]+', filterCb, pureFilter=True)
+        impure = Word('[a-z]', filterCb)
+        self._lexer.addTokenType(pure)
+        self._lexer.addTokenType(impure)
+
+        code = "x 12 y 12 x 12"
+        tokens = list(self._lexer.iterTokens(StringInput(code)))
+
+        self.assertEqual([impure in token.getTypes() for token in tokens],
+                         [False, False, True, False, False, False])
+        self.assertEqual([pure in token.getTypes() for token in tokens],
+                         [False, True, False, True, False, True])
+        # pure filter is called once, impure filter for every occurrence:
+        self.assertEqual(calls.count("12"), 1)
+        self.assertEqual(calls.count("x"), 2)
+
+        stats = self._lexer.getStatistics()
+        self.assertEqual(stats.cacheMisses, 3)
+        self.assertEqual(stats.cacheHits, 3)
+
     def testMultLineLiterals(self):
         
         print("Multi-Line-Literals:")
@@ -118,6 +224,63 @@ class LexerTest(unittest.TestCase):
             print(t.getText(), t.getTypes())
         print()
 
+class ScannerTest(LexerTest):
+
+    def setUp(self):
+
+        LexerTest.setUp(self)
+
+        self._lexer.enableScanner()
+
+    def testSameTokensAsLexer(self):
+
+        for code in ["a = 'x # y' + b.c(d); # comment\n\te.f('1.2 ').g;",
+                     "x = 'it\\'s';",
+                     "x = 'a''b';"]:
+
+            self._lexer.enableScanner()
+            tokens = self._tokenInfo(code)
+            self._lexer.enableScanner(False)
+            expected = self._tokenInfo(code)
+
+            self.assertEqual(tokens, expected)
+
+    def testSmallChunks(self):
+
+        code = "person.getAddress( ) ; '1.23'+'4.56'"
+        expected = self._tokenInfo(code)
+
+        self._lexer.setInputStream(StringInput(code))
+        self._lexer._initBuffer()
+        self._lexer._inputBuffer._chunkSize = 1
+        self._lexer._SCAN_LOOKAHEAD = 1
+        tokens = []
+        token = self._lexer.getNextToken()
+        while token:
+            tokens.append(self._info(token))
+            token = self._lexer.getNextToken()
+
+        self.assertEqual(tokens, expected)
+
+    def _tokenInfo(self, code):
+
+        self._lexer.setInputStream(StringInput(code))
+
+        res = []
+        token = self._lexer.getNextToken()
+        while token:
+            res.append(self._info(token))
+            token = self._lexer.getNextToken()
+
+        return res
+
+    def _info(self, token):
+
+        return (token.getText(),
+                token.getTypeIds(),
+                token.getStartPosition(),
+                token.getEndPosition())
+
 #### Run tests #####
 
 if __name__ == "__main__":
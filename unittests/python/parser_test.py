@@ -16,10 +16,24 @@
 
 import unittest
 import os
-from runtime.python.parser import Parser, TreeCatg
+import pickle
+import gc
+import tempfile
+from runtime.python.parser import Parser, Path, Context, TreeCatg, EventCatg, AstBuilder
+from runtime.python.parser import ParseError, ParseLimitError, SearchDepthError
+from runtime.python.instream import StringInput
 from runtime.python.position import Position
-from runtime.python.token import Keyword
-from grammar import TestGrammar
+from runtime.python.token import Keyword, Word, _restoreTokenType
+from runtime.python.grammar import defineRule, initialize, expand, tokenNode as tn, connector
+from runtime.python.grammar import _KeywordForkNode
+from grammar import TestGrammar, ChainGrammar, ListGrammar, CommitGrammar, AlternativesGrammar
+from grammar import FirstItemGrammar, LoopGrammar, KeywordGrammar, ForRule, FORALL, FOREACH, IN, ID, BRACE_OPEN, BRACE_CLOSE
+
+# Equal definitions, distinct token types:
+WORD_A = Word("[a-z]+")
+WORD_B = Word("[a-z]+")
+IF_A = Keyword("if")
+IF_B = Keyword("if")
 
 class ParserTest(unittest.TestCase):
 
@@ -51,6 +65,540 @@ class ParserTest(unittest.TestCase):
         self._checkNode(for1.getChildren()[1], 1, 9, 1, 14)
         self._checkNode(for2.getChildren()[1], 6, 13, 6, 18)
         
+    def testMmapFileInput(self):
+
+        filePath = os.path.abspath(os.path.dirname(__file__)) + os.sep + "testcode"
+
+        self._parser.setMmapThreshold(0)
+        root = self._parser.parseFile(filePath, TreeCatg.PARSE_TREE)
+        for1 = root.getChildren()[0]
+
+        self._checkNode(for1.getChildren()[1], 1, 9, 1, 14)
+
+    def testFileClosed(self):
+
+        # Larger than a block, so the files are still open when parsing stops:
+        code = "forall a {} " * 20000
+        filePaths = []
+        for content in [code, "forall {} " + code]:
+            fd, filePath = tempfile.mkstemp()
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            filePaths.append(filePath)
+
+        import runtime.python.parser as parserModule
+        inStreams = []
+        openFileInput = parserModule.openFileInput
+
+        def openAndTrack(filePath, mmapThreshold):
+
+            res = openFileInput(filePath, mmapThreshold)
+            inStreams.append(res)
+
+            return res
+
+        parserModule.openFileInput = openAndTrack
+        try:
+            parser = Parser(TestGrammar())
+            parser.setMmapThreshold(None)
+
+            items = parser.iterParseFile(filePaths[0])
+            next(items)
+            items.close()
+            self.assertIsNone(parser._curFile)
+
+            self.assertRaises(ParseError, parser.parseFile, filePaths[1])
+            self.assertIsNone(parser._curFile)
+        finally:
+            parserModule.openFileInput = openFileInput
+            for filePath in filePaths:
+                os.remove(filePath)
+
+        self.assertEqual([inStream._file for inStream in inStreams], [None, None])
+
+    def testTabSize(self):
+
+        filePath = os.path.abspath(os.path.dirname(__file__)) + os.sep + "testcode"
+
+        parser = Parser(TestGrammar())
+        parser.setTabSize(8)
+        root = parser.parseFile(filePath, TreeCatg.PARSE_TREE)
+        for2 = root.getChildren()[1]
+
+        self._checkNode(for2.getChildren()[1], 6, 17, 6, 22)
+
+        # Default tab size of other parsers is not affected:
+        self.testPositionInfo()
+
+    def testUniversalNewlines(self):
+
+        self._parser.enableUniversalNewlines()
+        tokenInfo = self._parser.getTokenInfoFromString("forall a {}\r\rforall\r\n\tb {}")
+        tokens = [token for _, token in tokenInfo]
+
+        self.assertEqual(tokens[4].getStartPosition(), (3, 1))
+        self.assertEqual(tokens[5].getStartPosition(), (4, 5))
+
+    def testTokenize(self):
+
+        filePath = os.path.abspath(os.path.dirname(__file__)) + os.sep + "testcode"
+
+        expected = [(token.getText(), token.getStartPosition(), token.getEndPosition())
+                    for _, token in self._parser.getTokenInfoFromFile(filePath)]
+
+        tokens = self._parser.tokenizeFile(filePath)
+        first = next(tokens)
+        self.assertEqual(first.getText(), "foreach")
+
+        res = [(token.getText(), token.getStartPosition(), token.getEndPosition())
+               for token in tokens]
+
+        self.assertEqual([expected[0]] + res, expected)
+
+    def testFirstSetPruning(self):
+
+        filePath = os.path.abspath(os.path.dirname(__file__)) + os.sep + "testcode"
+
+        root = self._parser.parseFile(filePath, TreeCatg.PARSE_TREE)
+        stats = self._parser.getStatistics()
+        self.assertTrue(stats.prunedNodes > 0)
+
+        parser = Parser(TestGrammar())
+        parser.enableBlockComments()
+        parser.enableFullBacktracking()
+        parser.enableFirstSetPruning(False)
+        expected = parser.parseFile(filePath, TreeCatg.PARSE_TREE)
+
+        self.assertEqual(root.toXml(), expected.toXml())
+        self.assertEqual(parser.getStatistics().prunedNodes, 0)
+        self.assertTrue(stats.nodeVisits < parser.getStatistics().nodeVisits)
+
+    def testFirstSet(self):
+
+        rule = ForRule()
+        self.assertEqual(rule.getSocket().getFirstSet(),
+                         frozenset([FORALL.getId(), FOREACH.getId()]))
+
+        rule.setContextDependent()
+        self.assertEqual(rule.getSocket().getFirstSet(), None)
+
+    def testFirstSetInvalidation(self):
+
+        first = connector()
+        first.connect(tn(ID))
+        second = connector()
+        second.connect(tn(IN))
+        dependent = connector()
+        dependent.connect(first)
+
+        self.assertEqual(first.getFirstSet(), frozenset([ID.getId()]))
+        self.assertEqual(second.getFirstSet(), frozenset([IN.getId()]))
+        self.assertEqual(dependent.getFirstSet(), frozenset([ID.getId()]))
+
+        # Unrelated graphs keep their FIRST sets:
+        second.connect(tn(FORALL))
+        self.assertTrue(dependent._hasFirstSet())
+
+        first.connect(tn(FOREACH))
+        self.assertFalse(dependent._hasFirstSet())
+        self.assertEqual(dependent.getFirstSet(), frozenset([ID.getId(), FOREACH.getId()]))
+
+    def testFirstSetDependents(self):
+
+        shared = ForRule()
+        shared.getSocket().getFirstSet()
+
+        # Like expansions of a context dependent rule, one per use:
+        for idx in range(100):
+            start = connector()
+            start.connect(shared)
+            self.assertEqual(start.getFirstSet(), shared.getSocket().getFirstSet())
+        del start
+        gc.collect()
+
+        self.assertEqual(len(shared.getSocket()._firstSetGraph._dependents), 0)
+
+    def testContextDependence(self):
+
+        self.assertFalse(ForRule().dependsOnContext())
+
+        BracesRule = defineRule("Braces")
+
+        @expand(BracesRule)
+        def braces_expand(start, end, context):
+
+            try:
+                braces = context["braces"]
+            except Exception:
+                braces = False
+
+            if braces:
+                start.connect(tn(BRACE_OPEN)).connect(tn(BRACE_CLOSE)).connect(end)
+            else:
+                start.connect(end)
+
+        self.assertTrue(BracesRule().dependsOnContext())
+
+        contexts = []
+        StoreRule = defineRule("Store")
+
+        @expand(StoreRule)
+        def store_expand(start, end, context):
+
+            contexts.append(context)
+            start.connect(end)
+
+        # A kept context may be used later on:
+        rule = StoreRule()
+        self.assertTrue(rule.dependsOnContext())
+
+        # The probing expansion is reused:
+        expansions = []
+        CountRule = defineRule("Count")
+
+        @expand(CountRule)
+        def count_expand(start, end, context):
+
+            expansions.append(start)
+            start.connect(end)
+
+        rule = CountRule()
+        rule.getSocket().getSuccessors(None)
+        self.assertFalse(rule.dependsOnContext())
+        rule.getSocket().getSuccessors(None)
+        self.assertEqual(len(expansions), 1)
+
+        # Declarations are not probed:
+        del contexts[:]
+        rule = StoreRule()
+        rule.setContextIndependent()
+        self.assertFalse(rule.dependsOnContext())
+        self.assertEqual(contexts, [])
+
+    def testExpansionCache(self):
+
+        KindRule = defineRule("Kind")
+
+        @initialize(KindRule)
+        def kind_init(rule):
+
+            rule.setContextDependent(["kind"], maxEntries=2)
+
+        @expand(KindRule)
+        def kind_expand(start, end, context):
+
+            start.connect(tn(context["kind"])).connect(end)
+
+        outer = ForRule()
+        outer.setEnvVar("kind", FORALL)
+        path = Path()
+        path.push(outer.getSocket(), None)
+
+        socket = KindRule().getSocket()
+
+        first = socket.getSuccessors(Context(path))
+        self.assertIs(socket.getSuccessors(Context(path))[0], first[0])
+
+        outer.setEnvVar("kind", FOREACH)
+        self.assertIsNot(socket.getSuccessors(Context(path))[0], first[0])
+        outer.setEnvVar("kind", IN)
+        socket.getSuccessors(Context(path))
+
+        stats = socket.getExpansionCache().getStatistics()
+        self.assertEqual((stats.hits, stats.misses, stats.evictions), (1, 3, 1))
+        self.assertEqual(socket.getExpansionCache().getSize(), 2)
+
+        # Each cache counts on its own:
+        other = KindRule().getSocket()
+        other.getSuccessors(Context(path))
+        self.assertEqual(other.getExpansionCache().getStatistics().misses, 1)
+        self.assertEqual(stats.misses, 3)
+
+    def testSearchDepth(self):
+
+        parser = Parser(ChainGrammar())
+        root = parser.parseString("a")
+        self.assertEqual(root.getChildren()[0].getChildById('id').getText(), "a")
+
+        parser.setMaxSearchDepth(100)
+        with self.assertRaises(SearchDepthError) as cm:
+            parser.parseString("a")
+        self.assertEqual(cm.exception.ruleStack, ["ChainGrammar", "Chain"])
+
+    def testMemoization(self):
+
+        parsers = []
+        for memoSize in [0, 1000, 10]:
+            parser = Parser(ListGrammar())
+            parser.enableFullBacktracking()
+            parser.enableMemoization(memoSize > 0, memoSize)
+            self.assertRaises(ParseError, parser.parseString, "a " * 10 + "{")
+            parsers.append(parser)
+
+        noMemo, memo, smallMemo = [parser.getStatistics() for parser in parsers]
+        self.assertEqual(noMemo.memoHits, 0)
+        self.assertTrue(memo.memoHits > 0)
+        self.assertTrue(10 * memo.nodeVisits < noMemo.nodeVisits)
+        self.assertEqual(memo.memoEvictions, 0)
+        self.assertTrue(smallMemo.memoEvictions > 0)
+
+        code = "a b c d }"
+        self.assertEqual(parsers[0].parseString(code).toXml(),
+                         parsers[1].parseString(code).toXml())
+
+    def testParseLimits(self):
+
+        code = "a " * 30 + "{"
+
+        for limits in [{'maxBacktrackSteps': 50},
+                       {'maxNodeVisits': 100},
+                       {'timeout': 0.05}]:
+            parser = Parser(ListGrammar())
+            parser.enableFullBacktracking()
+            parser.setParseLimits(**limits)
+            with self.assertRaises(ParseLimitError) as cm:
+                parser.parseString(code)
+            self.assertEqual(cm.exception.ruleStack[0], "ListGrammar")
+            self.assertIn(cm.exception.token.getText(), ["a", "{"])
+
+        parser.setParseLimits()
+        self.assertEqual(parser.parseString("a b }").getName(), "ListGrammar")
+        self.assertTrue(issubclass(SearchDepthError, ParseLimitError))
+
+    def testPathCompaction(self):
+
+        code = "forall a { foreach b in c { forall d {} } forall e {} }" * 20
+
+        parser = Parser(TestGrammar())
+        expected = parser.parseString(code).toXml()
+        path = parser._getPath(StringInput(code))
+        length = path.getLength()
+        tokens = [elem.getToken() for elem in path if elem.getToken()]
+
+        interval = Path.COMPACTION_INTERVAL
+        Path.COMPACTION_INTERVAL = 4
+        try:
+            parser.enablePathCompaction()
+            self.assertEqual(parser.parseString(code).toXml(), expected)
+            path = parser._getPath(StringInput(code))
+            self.assertTrue(path.getLength() < length)
+            self.assertEqual(len([elem for elem in path if elem.getToken()]), len(tokens))
+        finally:
+            Path.COMPACTION_INTERVAL = interval
+
+    def testPathCompactionWhileParsing(self):
+
+        class TracingParser(Parser):
+
+            def _iterPath(self, inStream, compaction=False):
+
+                self.maxLength = 0
+                for path, complete in Parser._iterPath(self, inStream, compaction):
+                    self.maxLength = max(self.maxLength, path.getLength())
+                    yield path, complete
+
+        interval = Path.COMPACTION_INTERVAL
+        Path.COMPACTION_INTERVAL = 4
+        try:
+            maxLengths = []
+            for count in [20, 200]:
+                code = "forall a { foreach b in c { forall d {} } forall e {} }" * count
+                parser = TracingParser(TestGrammar())
+                expected = parser.parseString(code).toXml()
+                length = parser.maxLength
+                parser.enablePathCompaction()
+                self.assertEqual(parser.parseString(code).toXml(), expected)
+                self.assertTrue(parser.maxLength < length)
+                maxLengths.append(parser.maxLength)
+            self.assertEqual(maxLengths[0], maxLengths[1])
+        finally:
+            Path.COMPACTION_INTERVAL = interval
+
+    def testEnvVars(self):
+
+        outer = ForRule()
+        outer.setEnvVar('a', 1)
+        outer.setEnvVar('b', 1)
+        inner = ForRule()
+        inner.setEnvVar('a', 2)
+
+        path = Path()
+        path.push(outer.getSocket(), None)
+        path.push(inner.getSocket(), None)
+        self.assertEqual(path.getEnvVar('a'), 2)
+        self.assertEqual(path.getEnvVar('b'), 1)
+        self.assertIs(path.getCurEnvVars(), inner.getEnvVars())
+        self.assertEqual(path.getEnvSignature(), ((('a', 1), ('b', 1)), (('a', 2),)))
+
+        # Shadowed values are part of the signature:
+        other = ForRule()
+        other.setEnvVar('a', 3)
+        other.setEnvVar('b', 1)
+        otherPath = Path()
+        otherPath.push(other.getSocket(), None)
+        otherPath.push(inner.getSocket(), None)
+        self.assertNotEqual(otherPath.getEnvSignature(), path.getEnvSignature())
+
+        path.push(inner.getPlug(), None)
+        self.assertEqual(path.getEnvVar('a'), 1)
+        self.assertIs(path.getCurEnvVars(), outer.getEnvVars())
+
+        path.pop()
+        self.assertEqual(path.getEnvVar('a'), 2)
+        path.pop()
+        path.pop()
+        self.assertEqual(path.getEnvVar('a'), None)
+        self.assertEqual(path.getCurEnvVars(), None)
+
+    def testParseEvents(self):
+
+        code = "forall a { foreach b in c { forall d {} } forall e {} }" * 20
+
+        for fullBacktracking in [False, True]:
+
+            parser = Parser(TestGrammar())
+            parser.enableFullBacktracking(fullBacktracking)
+            expected = parser.parseString(code).toXml()
+            parser.resetStatistics()
+
+            builder = AstBuilder()
+            firstRuleEnd = None
+            for event in parser.parseEventsFromString(code):
+                builder.addEvent(event)
+                if firstRuleEnd is None and event.getCatg() == EventCatg.RULE_END:
+                    firstRuleEnd = parser.getStatistics().nodeVisits
+
+            self.assertEqual(builder.getResult().toXml(), expected)
+            if fullBacktracking:
+                self.assertEqual(firstRuleEnd, parser.getStatistics().nodeVisits)
+            else:
+                self.assertTrue(firstRuleEnd < parser.getStatistics().nodeVisits / 10)
+
+    def testCommitPoints(self):
+
+        code = "forall a { foreach b in c { forall d {} } forall e {} }" * 20
+
+        parser = Parser(CommitGrammar())
+        parser.enableFullBacktracking()
+
+        firstRuleEnd = None
+        for event in parser.parseEventsFromString(code):
+            if firstRuleEnd is None and event.getCatg() == EventCatg.RULE_END:
+                firstRuleEnd = parser.getStatistics().nodeVisits
+        self.assertTrue(firstRuleEnd < parser.getStatistics().nodeVisits / 10)
+
+        expected = Parser(TestGrammar()).parseString(code).getChildren()
+        res = parser.parseString(code).getChildren()
+        self.assertEqual([node.toXml() for node in res], [node.toXml() for node in expected])
+
+        for withCommit in [False, True]:
+            parser = Parser(AlternativesGrammar(withCommit))
+            parser.enableFullBacktracking()
+            if withCommit:
+                self.assertRaises(ParseError, parser.parseString, "a b")
+            else:
+                self.assertEqual(len(parser.parseString("a b").getChildren()), 2)
+
+    def testIterParse(self):
+
+        code = "forall a { foreach b in c { forall d {} } forall e {} }" * 20
+
+        parser = Parser(TestGrammar())
+        expected = [node.toXml() for node in parser.parseString(code).getChildren()]
+        parser.resetStatistics()
+
+        items = []
+        for item in parser.iterParseString(code):
+            if not items:
+                firstItem = parser.getStatistics().nodeVisits
+            self.assertIsNone(item.getParent())
+            items.append(item.toXml())
+
+        self.assertEqual(items, expected)
+        self.assertTrue(firstItem < parser.getStatistics().nodeVisits / 10)
+
+        # The grammar's transformation reads items, which are detached:
+        parser = Parser(FirstItemGrammar())
+        self.assertEqual([item.toXml() for item in parser.iterParseString(code)], expected)
+
+    def testReleaseLines(self):
+
+        code = "forall a {\n\tforall b {}\n}\n" * 200
+
+        parser = Parser(TestGrammar())
+        for event in parser.parseEventsFromString(code):
+            # The whole string has been indexed, lines are released behind
+            # the final tokens:
+            numLines = parser._lexer.getLineIndex().getNumLines()
+            token = event.getToken()
+            if event.getCatg() == EventCatg.TOKEN and token.getText() == "b":
+                lastToken = token
+
+        self.assertTrue(numLines < 10)
+        self.assertEqual(lastToken.getStartPosition(), (599, 12))
+
+    def testCompiledGrammar(self):
+
+        code = "forall a { forall b { } foreach c in d { forall e { } } } foreach f in g { }"
+        expected = Parser(LoopGrammar()).parseString(code).toXml()
+
+        compiled = LoopGrammar().compile()
+
+        self.assertEqual(Parser(compiled).parseString(code).toXml(), expected)
+
+        compiled = pickle.loads(pickle.dumps(compiled))
+
+        self.assertIs(compiled.getTokenTypes()[0], ID)
+
+        parser = Parser(compiled)
+        parser.enableMemoization()
+        self.assertEqual(parser.parseString(code).toXml(), expected)
+
+        parser.enableFullBacktracking()
+        self.assertEqual(parser.parseString(code).toXml(), expected)
+
+        self.assertRaises(ParseError, parser.parseString, "forall a { foreach }")
+
+    def testPickledTokenTypes(self):
+
+        local = [Word("[0-9]+"), Word("[0-9]+")]
+        tokenTypes = [WORD_A, WORD_B, IF_A, IF_B] + local
+
+        for restored, tokenType in zip(pickle.loads(pickle.dumps(tokenTypes)), tokenTypes):
+            self.assertIs(restored, tokenType)
+
+        # Unpickled in another process:
+        cls, state, globalName, processId = WORD_B.__reduce__()[1]
+        self.assertIs(_restoreTokenType(cls, state, globalName, ("other", 1)), WORD_B)
+
+        cls, state, globalName, processId = local[1].__reduce__()[1]
+        self.assertIsNone(globalName)
+        restored = _restoreTokenType(cls, state, globalName, ("other", processId[1]))
+        self.assertNotIn(restored.getId(), [tokenType.getId() for tokenType in tokenTypes])
+
+    def testCompiledRuleInstances(self):
+
+        # Differently parametrised rules of one class must not be merged:
+        code = "a x b y"
+        expected = Parser(KeywordGrammar()).parseString(code).toXml()
+
+        compiled = KeywordGrammar().compile()
+
+        self.assertEqual(Parser(compiled).parseString(code).toXml(), expected)
+
+    def testKeywordFork(self):
+
+        filePath = os.path.abspath(os.path.dirname(__file__)) + os.sep + "testcode"
+        expected = self._parser.parseFile(filePath).toXml()
+
+        compiled = TestGrammar().compile()
+        self.assertTrue([node for node in compiled._nodes
+                         if isinstance(node, _KeywordForkNode)])
+
+        parser = Parser(compiled)
+        parser.enableBlockComments()
+        self.assertEqual(parser.parseFile(filePath).toXml(), expected)
+
     def testTokenInfo(self):
         
         filePath = os.path.abspath(os.path.dirname(__file__)) + os.sep + "testcode"
@@ -75,6 +623,14 @@ class ParserTest(unittest.TestCase):
         self.assertEqual(line, expEndLine)
         self.assertEqual(col, expEndCol)
         
+class ScannerParserTest(ParserTest):
+
+    def setUp(self):
+
+        ParserTest.setUp(self)
+
+        self._parser.enableScanner()
+
 if __name__ == "__main__":
     
     unittest.main()